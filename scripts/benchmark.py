@@ -0,0 +1,278 @@
+#!/usr/bin/env python
+# Offline performance benchmarks of bicleaner-hardrules, nothing is downloaded.
+# Tiny stand-in models are built from a synthetic corpus made by hardrules.synthetic: character language models
+# in ARPA format and a fastText porn removal classifier, then the script measures
+# each rule, wrong_tu, wrong_tu_batch and whole runs with several processes and block sizes.
+#   python scripts/benchmark.py run -o results.json
+#   python scripts/benchmark.py compare baseline.json results.json
+# compare exits with status 1 if any result is worse than the baseline beyond the tolerance.
+import argparse
+import json
+import logging
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import timeit
+
+from collections import Counter
+from datetime import datetime, timezone
+from inspect import signature
+from tempfile import TemporaryDirectory
+
+porn_words = "sexy nude hot girls xxx webcam adult dating".split()
+
+def make_corpus(path, pairs, seed):
+    from hardrules.synthetic import write_bitext
+    with open(path, "wb") as f:
+        write_bitext(f, pairs, seed)
+
+def char_tokens(text):
+    return ["SPACE" if c == " " else c for c in text]
+
+def write_char_arpa(path, sentences):
+    ''' Character bigram model with add-one unigrams, good enough to exercise KenLM '''
+    unigrams = Counter()
+    bigrams = Counter()
+    for text in sentences:
+        tokens = ["<s>"] + char_tokens(text) + ["</s>"]
+        unigrams.update(tokens[1:])
+        bigrams.update(zip(tokens, tokens[1:]))
+    vocab = sorted(set(unigrams) | {"<s>", "<unk>"})
+    total = sum(unigrams.values()) + len(vocab)
+    lines = ["", "\\data\\", f"ngram 1={len(vocab)}", f"ngram 2={len(bigrams)}", "", "\\1-grams:"]
+    for token in vocab:
+        logprob = -99 if token == "<s>" else math.log10((unigrams[token] + 1) / total)
+        lines.append(f"{logprob:.6f}\t{token}\t-0.3")
+    lines += ["", "\\2-grams:"]
+    for (a, b), count in sorted(bigrams.items()):
+        context = len(sentences) if a == "<s>" else unigrams[a]
+        lines.append(f"{math.log10(count / context):.6f}\t{a} {b}")
+    lines += ["", "\\end\\", ""]
+    with open(path, "w") as f:
+        f.write("\n".join(lines))
+
+def build_models(workdir, corpus_path):
+    ''' Stand-in models and their metadata, returns the metadata path '''
+    import fasttext
+    import yaml
+    from hardrules.lm import LMFluencyFilter, LMType
+
+    with open(corpus_path) as f:
+        pairs = [line.rstrip("\n").split("\t") for _, line in zip(range(5000), f)]
+    for side, lang in enumerate(("en", "de")):
+        write_char_arpa(os.path.join(workdir, f"{lang}.arpa"), [pair[side] for pair in pairs if pair[side]])
+
+    # Perplexity stats of clean and shuffled sentences, like the real training does
+    rng = random.Random(1)
+    scores = {"clean": [], "noisy": []}
+    filters = []
+    for lang in ("en", "de"):
+        lm_filter = LMFluencyFilter(LMType.CHARACTER, lang, None)
+        lm_filter.load_lm(os.path.join(workdir, f"{lang}.arpa"))
+        filters.append(lm_filter)
+    for left, right in pairs[:500]:
+        scores["clean"].append(filters[0].score(left) + filters[1].score(right))
+        left, right = "".join(rng.sample(left, len(left))), "".join(rng.sample(right, len(right)))
+        scores["noisy"].append(filters[0].score(left) + filters[1].score(right))
+    def mean_std(values):
+        mean = sum(values) / len(values)
+        return mean, math.sqrt(sum((v - mean) ** 2 for v in values) / len(values))
+
+    train_path = os.path.join(workdir, "porn.train")
+    with open(train_path, "w") as f:
+        for n, (left, _) in enumerate(pairs):
+            f.write(f"__label__negative {left.lower()}\n")
+            if n % 10 == 0:
+                f.write(f"__label__positive {' '.join(rng.sample(porn_words, 3))} {left.lower()}\n")
+    model = fasttext.train_supervised(input=train_path, dim=8, epoch=5, bucket=10000, minCount=1, thread=1, verbose=0)
+    model.save_model(os.path.join(workdir, "porn.bin"))
+
+    clean_mean, clean_stddev = mean_std(scores["clean"])
+    noisy_mean, noisy_stddev = mean_std(scores["noisy"])
+    metadata = {
+        "source_lang": "en", "target_lang": "de",
+        "lm_type": "CHARACTER", "source_lm": "en.arpa", "target_lm": "de.arpa",
+        "clean_mean_perp": clean_mean, "clean_stddev_perp": clean_stddev,
+        "noisy_mean_perp": noisy_mean, "noisy_stddev_perp": noisy_stddev,
+        "porn_removal_file": "porn.bin", "porn_removal_side": "sl",
+    }
+    metadata_path = os.path.join(workdir, "metadata.yaml")
+    with open(metadata_path, "w") as f:
+        yaml.safe_dump(metadata, f)
+    return metadata_path
+
+def best_time(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = timeit.default_timer()
+        function()
+        times.append(timeit.default_timer() - start)
+    return min(times)
+
+def micro_benchmarks(metadata_path, corpus_path, pairs, lang_ident, repeat):
+    ''' Microseconds per pair of each rule, each pipeline step, wrong_tu and wrong_tu_batch '''
+    import fasttext
+    import yaml
+    from hardrules.hardrules import Hardrules
+
+    with open(metadata_path) as f:
+        metadata = yaml.safe_load(f)
+    metadata["yamldir"] = os.path.dirname(metadata_path)
+    args = argparse.Namespace(
+            source_lang="en", target_lang="de",
+            disable_lm_filter=False, lm_threshold=0.5,
+            disable_porn_removal=False, disable_lang_ident=not lang_ident,
+            disable_minimal_length=False, run_all_rules=False,
+            rules_config=None, metadata_yaml=metadata,
+            porn_removal=fasttext.load_model(os.path.join(metadata["yamldir"], metadata["porn_removal_file"])),
+            source_tokenizer_command=None, target_tokenizer_command=None,
+            # Measure the rules, not the cache of repeated sentences
+            cache_size=0)
+    hardrules = Hardrules(args)
+
+    with open(corpus_path) as f:
+        sample = [line.rstrip("\n").split("\t") for _, line in zip(range(pairs), f)]
+    lefts = [left for left, _ in sample]
+    rights = [right for _, right in sample]
+    # Rules that need a model that is not loaded
+    unavailable = set()
+    if hardrules.fastspell_src is None:
+        unavailable.add("c_no_wrong_language")
+
+    results = {}
+    for name, rule in sorted(hardrules.rules.items()):
+        if name in unavailable:
+            continue
+        if "sentence" in signature(rule).parameters:
+            # Empty sentences are discarded before any other rule runs
+            column = [left for left in lefts if left]
+            run = lambda: [rule(sentence, side="left") for sentence in column]
+        else:
+            pairs_ok = [(left, right) for left, right in zip(lefts, rights) if left and right]
+            run = lambda: [rule(left, right) for left, right in pairs_ok]
+        results[f"rule/{name}"] = best_time(run, repeat) / len(sample) * 1e6
+
+    # The compiled steps over a whole block, as the workers run them
+    positions = [i for i in range(len(sample)) if lefts[i] and rights[i]]
+    for n, step in enumerate(hardrules.pipeline):
+        if step[0] == "no_empty":
+            continue
+        run = lambda: hardrules.run_step(n, lefts, rights, positions)
+        results[f"step/{step[1]}"] = best_time(run, repeat) / len(sample) * 1e6
+
+    results["wrong_tu"] = best_time(lambda: [hardrules.wrong_tu(l, r) for l, r in sample], repeat) / len(sample) * 1e6
+    results["wrong_tu_batch"] = best_time(lambda: hardrules.wrong_tu_batch(lefts, rights), repeat) / len(sample) * 1e6
+    return results
+
+def run_command(command):
+    result = subprocess.run(command, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        sys.stderr.write(result.stderr)
+        raise RuntimeError(f"Command failed with status {result.returncode}: {' '.join(command)}")
+
+def pipeline_benchmarks(metadata_path, corpus_path, tmp_dir, processes, block_sizes, lang_ident, repeat):
+    ''' Rows per second of whole runs '''
+    with open(corpus_path) as f:
+        rows = sum(1 for _ in f)
+    results = {}
+    for p in processes:
+        for block_size in block_sizes:
+            command = [sys.executable, "-m", "hardrules.bicleaner_hardrules", corpus_path, os.devnull,
+                       "-q", "--metadata", metadata_path,
+                       "-p", str(p), "-b", str(block_size), "--tmp_dir", tmp_dir]
+            if not lang_ident:
+                command.append("--disable_lang_ident")
+            elapsed = best_time(lambda: run_command(command), repeat)
+            results[f"pipeline/p{p}_b{block_size}"] = rows / elapsed
+            logging.info(f"{p} processes, blocks of {block_size}: {rows / elapsed:.0f} rows/s")
+    return results
+
+def run(args):
+    results = {}
+    with TemporaryDirectory() as workdir:
+        corpus_path = os.path.join(workdir, "corpus.tsv")
+        make_corpus(corpus_path, args.pairs, args.seed)
+        metadata_path = build_models(workdir, corpus_path)
+        logging.info("Models built, running rule benchmarks")
+
+        for name, value in micro_benchmarks(metadata_path, corpus_path, args.micro_pairs, args.lang_ident, args.repeat).items():
+            results[name] = {"value": value, "unit": "us/pair", "higher_is_better": False}
+        if args.processes:
+            for name, value in pipeline_benchmarks(metadata_path, corpus_path, workdir, args.processes,
+                    args.block_sizes, args.lang_ident, args.repeat).items():
+                results[name] = {"value": value, "unit": "rows/s", "higher_is_better": True}
+
+    from hardrules import __version__
+    report = {
+        "meta": {
+            "version": __version__, "python": platform.python_version(), "platform": platform.platform(),
+            "cpus": os.cpu_count(), "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "pairs": args.pairs, "micro_pairs": args.micro_pairs, "seed": args.seed, "lang_ident": args.lang_ident,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+    logging.info(f"Results written to {args.output}")
+
+def compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)["results"]
+    with open(args.results) as f:
+        results = json.load(f)["results"]
+
+    regressions = 0
+    print(f"{'benchmark':<40} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name in sorted(baseline.keys() & results.keys()):
+        old, new = baseline[name]["value"], results[name]["value"]
+        change = new / old - 1 if old else 0.0
+        # Positive is worse
+        worse = -change if results[name]["higher_is_better"] else change
+        flag = ""
+        if worse > args.tolerance:
+            flag = "  REGRESSION"
+            regressions += 1
+        elif worse < -args.tolerance:
+            flag = "  improved"
+        print(f"{name:<40} {old:>12.2f} {new:>12.2f} {change:>+8.1%} {results[name]['unit']}{flag}")
+    for name in sorted(baseline.keys() - results.keys()):
+        print(f"{name:<40} missing in current results")
+
+    if regressions:
+        print(f"{regressions} regressions above {args.tolerance:.0%}")
+        sys.exit(1)
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline performance benchmarks of bicleaner-hardrules")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run the benchmarks and save the results as JSON")
+    run_parser.add_argument("-o", "--output", default="benchmark.json", help="Results file")
+    run_parser.add_argument("--pairs", type=int, default=20000, help="Sentence pairs of the synthetic corpus for whole runs")
+    run_parser.add_argument("--micro_pairs", type=int, default=2000, help="Sentence pairs for the rule benchmarks")
+    run_parser.add_argument("--processes", type=lambda v: [int(p) for p in v.split(",") if p], default=[1, 2],
+                            help="Comma separated numbers of processes of whole runs, empty to skip them")
+    run_parser.add_argument("--block_sizes", type=lambda v: [int(b) for b in v.split(",")], default=[1000, 10000],
+                            help="Comma separated block sizes of whole runs")
+    run_parser.add_argument("--repeat", type=int, default=3, help="Repetitions of each measurement, the best one is kept")
+    run_parser.add_argument("--seed", type=int, default=1, help="Seed of the synthetic corpus")
+    run_parser.add_argument("--lang_ident", action="store_true",
+                            help="Include language identification, needs the FastSpell model already downloaded")
+    run_parser.set_defaults(function=run)
+
+    compare_parser = subparsers.add_parser("compare", help="Compare results with a baseline")
+    compare_parser.add_argument("baseline", help="Baseline results file")
+    compare_parser.add_argument("results", help="Current results file")
+    compare_parser.add_argument("--tolerance", type=float, default=0.1, help="Relative change considered a regression")
+    compare_parser.set_defaults(function=compare)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    args.function(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# Measure the startup time of bicleaner-hardrules: module import time
+# and wall time of whole runs on a tiny input, where startup dominates.
+# Extra arguments are passed to bicleaner-hardrules, e.g. --metadata or -c
+#   python scripts/startup_benchmark.py -n 5 -- -s en -t de --disable_lang_ident
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import timeit
+
+from tempfile import TemporaryDirectory
+
+def time_command(command, runs):
+    times = []
+    for _ in range(runs):
+        start = timeit.default_timer()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        times.append(timeit.default_timer() - start)
+    return times
+
+def report(name, times):
+    print(f"{name}: min {min(times):.3f} s, median {statistics.median(times):.3f} s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup time benchmark of bicleaner-hardrules")
+    parser.add_argument('-n', '--runs', type=int, default=5, help="Number of runs of each measurement")
+    parser.add_argument('-p', '--processes', type=int, default=1, help="Worker processes of each run")
+    parser.add_argument('hardrules_args', nargs='*', help="Arguments for bicleaner-hardrules")
+    args = parser.parse_args()
+
+    report("Import", time_command([sys.executable, "-c", "import hardrules.bicleaner_hardrules"], args.runs))
+
+    with TemporaryDirectory() as tmp_dir:
+        input_path = os.path.join(tmp_dir, "input.tsv")
+        with open(input_path, "w") as f:
+            f.write("This is a sentence in English\tDas ist ein Satz auf Deutsch\n" * 10)
+
+        command = [sys.executable, "-m", "hardrules.bicleaner_hardrules", input_path, os.devnull,
+                   "-q", "-p", str(args.processes), "--tmp_dir", tmp_dir] + args.hardrules_args
+        report(f"Run with {args.processes} processes", time_command(command, args.runs))
+
+if __name__ == '__main__':
+    main()
@@ -1,31 +1,41 @@
 #!/usr/bin/env python
 
 import argparse
+import gc
+import hashlib
+import importlib.util
 import io
+import json
 import logging
 import os
 import sys
 import traceback
-import yaml
-import fasttext
-from fastspell import FastSpell
 
 from heapq import heappush, heappop
-from multiprocessing import Queue, Process, Value, cpu_count
-from tempfile import NamedTemporaryFile, gettempdir
+from multiprocessing import Queue, Process, Value, BoundedSemaphore, cpu_count, get_start_method
+from tempfile import gettempdir
 from timeit import default_timer
 
 #Allows to load modules while inside or outside the package
 try:
     from . import __version__
-    from .util import logging_setup, check_positive, check_positive_between_zero_and_one
+    from .util import logging_setup, check_positive, check_positive_or_zero, check_positive_between_zero_and_one, read_blocks, prefetch, memory_usage
     from .hardrules import Hardrules
+    from .models import load_porn_removal, effective_config, preflight, real_metadata_path
+    from .transport import get_transport, get_mapped_input, split_lines, MappedInput
+    from .compression import input_file, get_compression, import_zstandard, compress_block
+    from .verdict_store import VerdictStore
+    from .rule_stats import RuleStats
+    from .progress import Progress, ProgressWriter
 except (SystemError, ImportError):
-    from util import logging_setup, check_positive, check_positive_between_zero_and_one
+    from util import logging_setup, check_positive, check_positive_or_zero, check_positive_between_zero_and_one, read_blocks, prefetch, memory_usage
     from hardrules import Hardrules, __version__
-
-# Remove fasttext warning
-fasttext.FastText.eprint = lambda x: None
+    from models import load_porn_removal, effective_config, preflight, real_metadata_path
+    from transport import get_transport, get_mapped_input, split_lines, MappedInput
+    from compression import input_file, get_compression, import_zstandard, compress_block
+    from verdict_store import VerdictStore
+    from rule_stats import RuleStats
+    from progress import Progress, ProgressWriter
 
 logging_level = 0
 
@@ -33,8 +43,8 @@ def initialization():
     global logging_level
     
     parser = argparse.ArgumentParser(prog=os.path.basename(sys.argv[0]), formatter_class=argparse.ArgumentDefaultsHelpFormatter, description=__doc__)
-    parser.add_argument('input',  nargs='?', type=argparse.FileType('rt', errors="replace"), default=io.TextIOWrapper(sys.stdin.buffer, errors="replace"),  help="Tab-separated bilingual tagged file")
-    parser.add_argument('output', nargs='?', type=argparse.FileType('wt'), default=sys.stdout, help="Output of the classification")
+    parser.add_argument('input',  nargs='?', type=input_file, default=io.TextIOWrapper(sys.stdin.buffer, errors="replace"),  help="Tab-separated bilingual tagged file, gzip (.gz) and zstd (.zst) files are decompressed")
+    parser.add_argument('output', nargs='?', type=argparse.FileType('wt'), default=sys.stdout, help="Output of the classification, compressed with gzip or zstd if the name ends in .gz or .zst")
     parser.add_argument('--annotated_output',default=False, action='store_true', help="Adds an extra column with each sentence's evaluation (\"keep\" if the sentence is good, otherwise the reason for rejecting")
 
     #groupM = parser.add_argument_group('Mandatory')
@@ -44,12 +54,24 @@ def initialization():
     groupO = parser.add_argument_group('Optional')
     groupO.add_argument('-c', '--rules_config', type=argparse.FileType('r'), default=None, help="Rules configuration file")
     groupO.add_argument('--tmp_dir', default=gettempdir(), help="Temporary directory where creating the temporary files of this program")
+    groupO.add_argument('--input_mode', choices=['text', 'mmap', 'split'], default='text', help="How the input is read: 'text' decodes each line in the mapper, 'mmap' maps the input in memory when it is a regular file, workers only decode the source and target columns and the rest of the line is written unchanged, 'split' does the same but each worker finds the lines of its block, so blocks have approximately --block_size lines")
+    groupO.add_argument('--transport', choices=['file', 'shm'], default='file', help="How blocks are passed between processes: temporary files in --tmp_dir or shared memory segments (needs enough space in /dev/shm)")
     groupO.add_argument('-b', '--block_size', type=int, default=10000, help="Sentence pairs per block")
     groupO.add_argument('-p', '--processes', type=int, default=max(1, cpu_count()-1), help="Number of processes to use")
+    groupO.add_argument('--preload_models', default=False, action='store_true', help="Load the models once in the main process before starting the workers, which share them instead of loading their own copy")
+    groupO.add_argument('--cache_size', type=check_positive_or_zero, default=64, help="Memory in MB of each worker's cache of language model, language identification and porn removal results for repeated sentences, 0 disables it")
+    groupO.add_argument('--verdict_store', type=str, default=None, help="SQLite file where the verdicts are stored, re-runs with the same configuration only evaluate the sentence pairs not seen before. Changing the configuration, languages or models clears it")
+    groupO.add_argument('--reorder_window', type=check_positive, default=None, help="Maximum number of blocks being processed or waiting to be written in order, the mapper and workers wait when it is full (default: 4 blocks per process)")
 
     groupO.add_argument('--score_only',action='store_true', help="Only output one column which is the hardrule tag: 0(keep) 1(discard)", default=False)
     groupO.add_argument('-A', '--run_all_rules',action='store_true', help="Run all rules for each sentence instead of stopping at first discard", default=False)
+    groupO.add_argument('--stats_file', type=argparse.FileType('w'), default=None, help="Write a JSON report with the number of pairs checked and rejected by each rule, and the time spent with --profile_rules")
+    groupO.add_argument('--profile_rules', default=False, action='store_true', help="Measure the time spent in each rule, a summary is logged at the end")
+    groupO.add_argument('--metrics_file', type=str, default=None, help="File where progress metrics are written periodically in Prometheus text format: input mapped, rows finished and rows per second of each worker, queue sizes, reorder heap size and resident memory of each worker")
+    groupO.add_argument('--metrics_interval', type=check_positive, default=10, help="Seconds between updates of --metrics_file")
+    groupO.add_argument('--adaptive_order', type=check_positive_or_zero, default=0, help="Apply every rule to the first ADAPTIVE_ORDER pairs of each worker to measure their cost and rejection rate, then run the rules in the order that discards pairs with the least work. Verdicts don't change. The reason of a discarded pair is still the first rule in the default order that discards it, which takes extra work with --annotated_output. Ignored with --run_all_rules (default: 0, disabled)")
     groupO.add_argument('--disable_lang_ident', default=False, action='store_true', help="Don't apply rules that use language detecting")
+    groupO.add_argument('--fastspell_mode', choices=['aggr', 'cons'], default='aggr', help="FastSpell mode for sentences of languages similar to others, refined with hunspell: 'aggr' resolves ties in favour of the expected language, 'cons' identifies the sentence as unknown, and discards it, unless it has no spelling errors in the expected language")
     groupO.add_argument('--disable_minimal_length', default=False, action='store_true', help="Don't apply minimal length rule")
     groupO.add_argument('--disable_porn_removal', default=False, action='store_true', help="Don't apply porn removal")
     groupO.add_argument('--dont_ignore_long', default=False, action='store_true', help="Don't ignore too long sentences")
@@ -67,6 +89,7 @@ def initialization():
     #LM  filtering
     groupO.add_argument('--disable_lm_filter', default=False, action='store_true', help="Don't apply LM filtering")
     groupO.add_argument('--metadata', type=str, default=None, help="Bicleaner metadata (YAML file)")
+    groupO.add_argument('--lm_load_method', choices=['lazy', 'populate_or_lazy', 'populate_or_read', 'read', 'parallel_read'], default=None, help="How KenLM loads binary models: 'lazy' memory maps them and reads pages on demand, sharing them with other processes through the page cache, 'read' loads them in the memory of each process (default: 'lm_load_method' in metadata or KenLM default, populate_or_read)")
     groupO.add_argument('--lm_threshold',type=check_positive_between_zero_and_one, default=0.5, help="Threshold for language model fluency scoring.")
     #groupO.add_argument('--keep_lm_result',action='store_true', help="Add an additional column to the results with the language model fluency score.")
 
@@ -87,10 +110,19 @@ def initialization():
     if not os.path.exists(args.tmp_dir):
         os.makedirs(args.tmp_dir)
 
-    if not args.disable_lang_ident:
-        # Load a FastSpell objet to trigger download of fasttext langid
-        # before running hardrules
-        fsobj = FastSpell("en", mode="aggr")
+    # Each worker compresses its own output blocks
+    args.output_compression = get_compression(args.output.name)
+    if args.output_compression == 'zstd':
+        try:
+            import_zstandard()
+        except argparse.ArgumentTypeError as e:
+            parser.error(str(e))
+    if args.output_compression:
+        logging.info(f"Output will be compressed with {args.output_compression}")
+
+    # Heavy modules are imported only when needed, startup time matters for small inputs
+    if args.metadata is not None or args.rules_config is not None:
+        import yaml
 
     metadata_path = real_metadata_path(args.metadata)
 
@@ -110,10 +142,7 @@ def initialization():
                 args.disable_porn_removal = True
                 logging.warning("Porn removal classifier not present in metadata.")
             else:
-                try:
-                    args.porn_removal = fasttext.load_model(os.path.join(args.metadata_yaml["yamldir"], args.metadata_yaml['porn_removal_file']))
-                except:
-                    args.porn_removal = fasttext.load_model(args.metadata_yaml['porn_removal_file'])
+                args.porn_removal = load_porn_removal(args.metadata_yaml)
 
             if "source_tokenizer_command" in args.metadata_yaml:
                 args.source_tokenizer_command=args.metadata_yaml["source_tokenizer_command"]
@@ -163,47 +192,72 @@ def initialization():
     if args.disable_porn_removal:
         logging.info("Porn removal disabled.")
 
-    return args
+    preflight(args)
 
+    return args
 
-def real_metadata_path(path):
-    if path is None or os.path.exists(path):
-        # local path, we just use it, return abs path
-        return path
-    elif not path.startswith('bitextor/bicleaner-ai'):
-        # In case does not exist, check if it follows the pattern of HF bicleaner-ai models
-        # If not, just raise the error
-        raise FileNotFoundError(f"No such file or directory: {path}'.")
 
-    from huggingface_hub import snapshot_download
+def file_signature(path):
     try:
-        new_path = snapshot_download(path, local_files_only=True)
-    except FileNotFoundError:
-        raise FileNotFoundError(f"Could not find '{path}' in local HF cache, " \
-            "please download it with 'bicleaner-ai-download' before running hardrules")
-
-    return f"{new_path}/metadata.yaml"
-
-
-def reduce_process(output_queue, args):
+        stat = os.stat(path)
+        return [os.path.abspath(path), stat.st_size, stat.st_mtime_ns]
+    except OSError:
+        return [path]
+
+
+def verdict_fingerprint(args):
+    '''
+    Fingerprint of everything that changes the verdicts of a sentence pair:
+    version, rules configuration, languages, options, metadata and model files
+    '''
+    config = effective_config(args)
+    metadata = getattr(args, 'metadata_yaml', None) or {}
+    models = []
+    for name in ('source_lm', 'target_lm', 'porn_removal_file'):
+        if name in metadata:
+            path = os.path.join(metadata["yamldir"], metadata[name]) if "yamldir" in metadata else metadata[name]
+            models.append(file_signature(path if os.path.isfile(path) else metadata[name]))
+    if not args.disable_lang_ident and config['no_wrong_language']:
+        from importlib.metadata import version
+        fastspell = importlib.util.find_spec('fastspell')
+        models.append(['fastspell', version('fastspell'), getattr(args, 'fastspell_mode', "aggr")])
+        if fastspell is not None:
+            models.append(file_signature(os.path.join(fastspell.submodule_search_locations[0], 'lid.176.bin')))
+
+    options = {name: getattr(args, name, None) for name in (
+        'source_lang', 'target_lang', 'run_all_rules', 'disable_minimal_length', 'disable_lm_filter',
+        'disable_porn_removal', 'disable_lang_ident', 'lm_threshold',
+        'source_tokenizer_command', 'target_tokenizer_command')}
+    fingerprint = json.dumps([__version__, config, options, metadata, models], sort_keys=True, default=str)
+    return hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()
+
+
+def reduce_process(output_queue, window, transport, progress, args):
+    # Blocks are already encoded
+    output = args.output.buffer
     h = []
     last_block = 0
+    max_waiting = 0
+    worker_stats = []
     while True:
-        logging.debug("Reduce: heap status {0}".format(h.__str__()))
+        logging.debug("Reduce: waiting for block {0}, {1} blocks in reorder heap, {2}/{3} blocks in reorder window".format(
+                last_block, len(h), args.reorder_window - window.get_value(), args.reorder_window))
         while len(h) > 0 and h[0][0] == last_block:
-            nblock, filein_name = heappop(h)
+            nblock, handle = heappop(h)
             last_block += 1
-
-            with open(filein_name, 'r') as filein:
-                for i in filein:
-                    args.output.write(i)
-                filein.close()
-            os.unlink(filein_name)
+            output.write(transport.get(handle))
+            # Let the mapper send one more block
+            window.release()
+        progress.reorder_heap.value = len(h)
 
         job = output_queue.get()
-        if job:
-            nblock, filein_name = job
-            heappush(h, (nblock, filein_name))
+        if isinstance(job, dict):
+            # Rule stats sent by a worker when finishing
+            worker_stats.append(job)
+        elif job:
+            nblock, handle = job
+            heappush(h, (nblock, handle))
+            max_waiting = max(max_waiting, len(h))
         else:
             logging.debug("Exiting reduce loop")
             break
@@ -212,122 +266,189 @@ def reduce_process(output_queue, args):
         logging.debug("Still elements in heap")
 
     while len(h) > 0 and h[0][0] == last_block:
-        nblock, filein_name = heapq.heappop(h)
+        nblock, handle = heappop(h)
         last_block += 1
-
-        with open(filein_name, 'r') as filein:
-            for i in filein:
-                args.output.write(i)
-            filein.close()
-
-        os.unlink(filein_name)
+        output.write(transport.get(handle))
+        window.release()
 
     if len(h) != 0:
         logging.error("The queue is not empty and it should!")
 
+    logging.info("Maximum blocks waiting in reorder heap: {0}/{1}".format(max_waiting, args.reorder_window))
+    if worker_stats:
+        stats = RuleStats.from_dicts(worker_stats)
+        if args.profile_rules:
+            stats.log_summary()
+        if args.stats_file:
+            json.dump(stats.report(), args.stats_file, indent=2)
+            args.stats_file.write("\n")
+            args.stats_file.close()
+            logging.info("Rule stats written to {}".format(args.stats_file.name))
     logging.info("Hard rules applied. Output available in {}".format(args.output.name))
     args.output.close()
     
-def worker_process(i, jobs_queue, output_queue, args):
-    # Load Hardrules object
-    hardrules = Hardrules(args)
+def process_block(hardrules, lines, args, store=None):
+    '''
+    Classify a block of UTF-8 encoded input lines, without line endings.
+    Only the source and target columns are decoded, the rest of the line is written as is.
+    Pairs with a verdict in the store, if any, are not evaluated again.
+    Returns the list of encoded output lines, in the same order.
+    '''
+    prechecks = []
+    lefts = []
+    rights = []
+    for line in lines:
+        parts = line.split(b"\t")
+
+        if len(parts) >=  args.scol and len(parts) >= args.tcol:
+            left = parts[args.scol-1].decode("utf-8", errors="replace")
+            right = parts[args.tcol-1].decode("utf-8", errors="replace")
+        else:
+            logging.error("scol ({}) or tcol ({}) indexes above column number ({})".format(args.scol, args.tcol, len(parts)))
+            prechecks.append("missing_columns")
+            if hardrules.stats is not None:
+                hardrules.stats.add_precheck("missing_columns")
+            continue
+
+        # Check if dont_ignore_long is enabled and TU is longer than allowed
+        if not args.dont_ignore_long and (len(left) > 10000 or len(right) > 10000):
+            prechecks.append("not_too_long")
+            if hardrules.stats is not None:
+                hardrules.stats.add_precheck("not_too_long")
+            continue
+
+        # Pair will go through hardrules
+        prechecks.append(None)
+        lefts.append(left)
+        rights.append(right)
+
+    # Run hardrules for all the TUs that passed previous checks
+    if store is not None:
+        verdicts, reasons = store.wrong_tu_batch(hardrules, lefts, rights)
+    else:
+        verdicts, reasons = hardrules.wrong_tu_batch(lefts, rights)
+
+    output = []
+    n = 0
+    for line, precheck in zip(lines, prechecks):
+        if precheck is not None:
+            keep = False
+            discards = [precheck]
+        else:
+            keep = verdicts[n]
+            discards = hardrules.reason_labels(reasons[n]) if not keep and args.annotated_output else None
+            n += 1
+
+        # Print scores
+        if keep:
+            out = "1"
+            # Print keep annotation
+            if args.annotated_output:
+                out += "\tkeep"
+        else:
+            out = "0"
+            # Print rule annotation, as a '+' separated list of rules if run_all_rules
+            if args.annotated_output:
+                out += "\t" + "+".join(discards)
+        out = (out + "\n").encode("utf-8")
+
+        # Print input sentences when scoring_only is disabled
+        if not args.score_only:
+            out = line + b"\t" + out
+        output.append(out)
+
+    return output
+
+def worker_process(i, jobs_queue, output_queue, input_transport, transport, rows, progress, hardrules, args):
+    # Load Hardrules object, unless it has been loaded before starting the workers
+    if hardrules is None:
+        hardrules = Hardrules(args)
+    store = None
+    if args.verdict_store is not None:
+        store = VerdictStore(args.verdict_store)
 
     while True:
         job = jobs_queue.get()
         if job:
             logging.debug("Job {0}".format(job.__repr__()))
-            nblock, filein_name = job
-            ojob = None
-            with open(filein_name, 'r') as filein, NamedTemporaryFile(mode="w", delete=False, dir=args.tmp_dir) as fileout:
-                logging.debug("Classification: creating temporary filename {0}".format(fileout.name))
-
-                for i in filein:
-                    parts = i.rstrip('\n').split("\t")
-                    left = ""
-                    right= ""
-
-                    if len(parts) >=  args.scol and len(parts) >= args.tcol:
-                        left = parts[args.scol-1]
-                        right = parts[args.tcol-1]
-                        wrong_tu_results = False
-                    else:
-                        logging.error("scol ({}) or tcol ({}) indexes above column number ({})".format(args.scol, args.tcol, len(parts)))
-                        wrong_tu_results = ["missing_columns"]
-
-                    # Print input sentences when scoring_only is disabled
-                    if not args.score_only:
-                        fileout.write("\t".join(parts) + "\t")
-
-                    # Check if dont_ignore_long is enabled and TU is longer than allowed
-                    if not args.dont_ignore_long and (len(left) > 10000 or len(right) > 10000):
-                        wrong_tu_results = ["not_too_long"]
-
-                    # Run hardrules for TU if all previous checks pass
-                    if wrong_tu_results == False:
-                        wrong_tu_results = hardrules.wrong_tu(left, right)
-
-                    # Print scores
-                    if wrong_tu_results != False:
-                        fileout.write("0")
-                        # Print rule annotation
-                        if args.annotated_output:
-                            out = "\t"
-                            if args.run_all_rules:
-                                # print comma separated list of annotated rules
-                                for i, res in enumerate(wrong_tu_results):
-                                    if i != 0:
-                                        out += '+'
-                                    out += res
-                            else:
-                                out += wrong_tu_results
-                            fileout.write(out + '\n')
-                        else:
-                            fileout.write("\n")
-                    else:
-                        fileout.write("1")
-                        # Print keep annotation
-                        if args.annotated_output:
-                            fileout.write("\tkeep\n")
-                        else:
-                            fileout.write("\n")
-
-                ojob = (nblock, fileout.name)
-                filein.close()
-                fileout.close()
-
-
-            if ojob:                    
-                output_queue.put(ojob)
-
-            os.unlink(filein_name)
+            nblock, handle = job
+            lines = split_lines(input_transport.get(handle))
+            with rows.get_lock():
+                rows.value += len(lines)
+            output = compress_block(b"".join(process_block(hardrules, lines, args, store)), args.output_compression)
+            output_queue.put((nblock, transport.put(output)))
+            progress.rows_finished[i] += len(lines)
+            progress.blocks_finished[i] += 1
         else:
             logging.debug("Exiting worker")
             break
 
-def mapping_process(args, jobs_queue):
+    logging.info("Worker {0} memory: {1}".format(i, memory_usage()))
+    if hardrules.result_cache.max_entries > 0:
+        logging.info("Worker {0} result cache: {1}".format(i, hardrules.result_cache.stats()))
+    if store is not None:
+        logging.info("Worker {0} verdict store: {1}".format(i, store.stats()))
+        store.close()
+    if hardrules.stats is not None:
+        output_queue.put(hardrules.stats.to_dict())
+
+def preload_hardrules(args):
+    '''
+    Load the models in the main process, forked workers share them copy-on-write.
+    Returns None when each worker has to load its own.
+    '''
+    if get_start_method() != 'fork':
+        logging.warning("Models can only be preloaded when processes are started with fork, loading them in each worker.")
+        return None
+    if args.source_tokenizer_command or args.target_tokenizer_command:
+        # Workers can't share the pipes of the same tokenizer process
+        logging.warning("Models can't be preloaded with external tokenizers, loading them in each worker.")
+        return None
+
+    hardrules = Hardrules(args)
+    # Keep the garbage collector from touching, and thus copying, the objects loaded so far
+    gc.freeze()
+    logging.info("Models preloaded, main process memory: {0}".format(memory_usage()))
+    return hardrules
+
+def read_encoded_blocks(args):
+    ''' Read the input as text in blocks of encoded lines '''
+    for lines in read_blocks(args.input, args.block_size):
+        yield "".join(lines).encode("utf-8")
+
+def acquire_window(window, workers, interval=1):
+    '''
+    Wait for a free slot in the reorder window.
+    Returns False if a worker has died: the block it was processing would never
+    be written and free its slot, so the window could stay full forever.
+    '''
+    while not window.acquire(timeout=interval):
+        for i, worker in enumerate(workers):
+            if worker.exitcode is not None:
+                logging.error("Worker {0} exited with code {1} before the end of the input".format(i, worker.exitcode))
+                return False
+    return True
+
+def mapping_process(args, jobs_queue, window, input_transport, progress, workers):
     logging.info("Start mapping")
-    nblock = 0
-    nline = 0
-    mytemp = None
-    for line in args.input:
-        if (nline % args.block_size) == 0:
-            logging.debug("Creating block {}".format(nblock))
-            if mytemp:
-                job = (nblock, mytemp.name)
-                mytemp.close()
-                jobs_queue.put(job)
-                nblock += 1
-            mytemp = NamedTemporaryFile(mode="w", delete=False, dir=args.tmp_dir)
-            logging.debug("Mapping: creating temporary filename {0}".format(mytemp.name))
-        mytemp.write(line)
-        nline += 1
-
-    if nline > 0:
-        job = (nblock, mytemp.name)
-        mytemp.close()        
-        jobs_queue.put(job)
-
-    return nline
+    if isinstance(input_transport, MappedInput):
+        # Workers read the mapped input directly, only block boundaries or ids are sent
+        blocks = input_transport.blocks(args.block_size)
+    else:
+        # Read next block in background while the current one is being handed to the workers
+        blocks = prefetch(read_encoded_blocks(args))
+
+    for nblock, block in enumerate(blocks):
+        # Wait until the reducer has written enough blocks to fit this one in the reorder window
+        if not window.acquire(block=False):
+            logging.debug("Mapping: reorder window full, waiting for the reducer")
+            if not acquire_window(window, workers):
+                logging.error("Stopping mapping")
+                return
+        logging.debug("Creating block {}".format(nblock))
+        jobs_queue.put((nblock, input_transport.put(block)))
+        progress.blocks_mapped.value += 1
+        progress.bytes_mapped.value += input_transport.block_bytes(block) if isinstance(input_transport, MappedInput) else len(block)
         
 def perform_hardrules_filtering(args):
     time_start = default_timer()
@@ -339,10 +460,31 @@ def perform_hardrules_filtering(args):
 
     output_queue = Queue(maxsize = maxsize)
     worker_count = process_count
+    # Rows read by the workers
+    rows = Value('Q', 0)
+    progress = Progress(worker_count)
+
+    # Blocks that have been mapped but not yet written to the output
+    if args.reorder_window is None:
+        args.reorder_window = 4 * process_count
+    logging.info("Reorder window of {0} blocks".format(args.reorder_window))
+    window = BoundedSemaphore(args.reorder_window)
+
+    # Create block transport before starting the processes that share it
+    transport = get_transport(args)
+    # Workers read the input blocks from the memory mapped input, if any
+    input_transport = get_mapped_input(args) or transport
+
+    if args.verdict_store is not None:
+        VerdictStore.prepare(args.verdict_store, verdict_fingerprint(args))
+
+    hardrules = None
+    if args.preload_models:
+        hardrules = preload_hardrules(args)
 
     # Start reducer
     reduce = Process(target = reduce_process,
-                     args   = (output_queue, args))
+                     args   = (output_queue, window, transport, progress, args))
     reduce.start()
 
     # Start workers
@@ -350,14 +492,21 @@ def perform_hardrules_filtering(args):
     workers = []
     for i in range(worker_count):
         filter = Process(target = worker_process,
-                         args   = (i, jobs_queue, output_queue, args))
+                         args   = (i, jobs_queue, output_queue, input_transport, transport, rows, progress, hardrules, args))
         filter.daemon = True # dies with the parent process
 
         filter.start()
         workers.append(filter)
 
+    progress_writer = None
+    if args.metrics_file is not None:
+        input_bytes = input_transport.input_bytes() if isinstance(input_transport, MappedInput) else None
+        progress_writer = ProgressWriter(progress, args.metrics_file, args.metrics_interval,
+                {'jobs': jobs_queue, 'output': output_queue}, workers, input_bytes)
+        progress_writer.start()
+
     # Mapper process (foreground - parent)
-    nline = mapping_process(args, jobs_queue)
+    mapping_process(args, jobs_queue, window, input_transport, progress, workers)
     args.input.close()
 
     # Worker termination
@@ -375,9 +524,12 @@ def perform_hardrules_filtering(args):
     # Reducer termination
     output_queue.put(None)
     reduce.join()
+    if progress_writer is not None:
+        progress_writer.stop()
     
 
     # Stats
+    nline = rows.value
     logging.info("Finished")
     elapsed_time = default_timer() - time_start
     logging.info("Total: {0} rows".format(nline))
@@ -0,0 +1,100 @@
+import argparse
+import gzip
+import io
+
+from functools import partial
+
+try:
+    from .util import prefetch
+except (SystemError, ImportError):
+    from util import prefetch
+
+# Compression formats by file extension
+extensions = {
+    '.gz': 'gzip',
+    '.zst': 'zstd',
+    '.zstd': 'zstd',
+}
+
+# Size of the decompressed chunks read in background
+chunk_size = 1024 * 1024
+
+compressors = {}
+
+def get_compression(path):
+    ''' Compression format of a file given its name, None if not compressed '''
+    for extension, compression in extensions.items():
+        if path.endswith(extension):
+            return compression
+    return None
+
+def import_zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise argparse.ArgumentTypeError("'zstandard' package is needed for .zst files, install it with 'pip install zstandard'")
+    return zstandard
+
+
+class ChunkReader(io.RawIOBase):
+    ''' Read-only stream over an iterator of bytes chunks '''
+
+    def __init__(self, chunks, name, source):
+        self.chunks = chunks
+        self.name = name
+        self.source = source
+        self.chunk = b''
+        self.offset = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        if self.offset == len(self.chunk):
+            self.chunk = next(self.chunks, b'')
+            self.offset = 0
+        n = min(len(b), len(self.chunk) - self.offset)
+        b[:n] = self.chunk[self.offset:self.offset + n]
+        self.offset += n
+        return n
+
+    def close(self):
+        if not self.closed:
+            self.source.close()
+        super().close()
+
+
+def input_file(path):
+    '''
+    Open an input file for argparse.
+    Compressed files are decompressed in a background thread.
+    '''
+    compression = get_compression(path)
+    if compression is None:
+        return argparse.FileType('rt', errors="replace")(path)
+
+    try:
+        if compression == 'zstd':
+            zstandard = import_zstandard()
+            # Read all the frames, files written by hardrules have one frame per block
+            source = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), read_across_frames=True, closefd=True)
+        else:
+            source = gzip.open(path, 'rb')
+    except OSError as e:
+        raise argparse.ArgumentTypeError(f"can't open '{path}': {e}")
+
+    chunks = prefetch(iter(partial(source.read, chunk_size), b''), size=4)
+    return io.TextIOWrapper(io.BufferedReader(ChunkReader(chunks, path, source)), errors="replace")
+
+def compress_block(data, compression):
+    '''
+    Compress a block as a complete gzip member or zstd frame,
+    concatenated blocks are a valid compressed file.
+    '''
+    if compression == 'gzip':
+        return gzip.compress(data, compresslevel=6)
+    elif compression == 'zstd':
+        if 'zstd' not in compressors:
+            compressors['zstd'] = import_zstandard().ZstdCompressor(level=3)
+        return compressors['zstd'].compress(data)
+    return data
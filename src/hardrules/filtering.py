@@ -0,0 +1,178 @@
+import logging
+import os
+
+from collections import deque
+from dataclasses import dataclass
+from itertools import islice
+from multiprocessing import Pool
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Sequence, Union
+
+try:
+    from .hardrules import Hardrules
+    from .models import real_metadata_path, load_porn_removal, preflight
+except (SystemError, ImportError):
+    from hardrules import Hardrules
+    from models import real_metadata_path, load_porn_removal, preflight
+
+# Pairs with a side longer than this are discarded without applying the rules, as the command line does
+ignore_length = 10000
+
+
+@dataclass
+class HardrulesConfig:
+    '''
+    Configuration of Hardrules without an argparse Namespace, options have the same names
+    and defaults as the command line. It can be passed to Hardrules instead of the parsed arguments.
+    metadata is a metadata YAML file or a HF model name, like --metadata, and gives the languages,
+    models and tokenizers not set explicitly. metadata_yaml can be given instead, as an already loaded dict.
+    rules_config is a dict of rule options or the path of a YAML file with them.
+    The porn removal model is loaded the first time it is used, so the configuration
+    can be sent to other processes before loading it.
+    '''
+    source_lang: Optional[str] = None
+    target_lang: Optional[str] = None
+    metadata: Optional[str] = None
+    metadata_yaml: Optional[dict] = None
+    rules_config: Union[dict, str, None] = None
+    run_all_rules: bool = False
+    disable_lm_filter: bool = False
+    disable_porn_removal: bool = False
+    disable_lang_ident: bool = False
+    disable_minimal_length: bool = False
+    dont_ignore_long: bool = False
+    lm_threshold: float = 0.5
+    lm_load_method: Optional[str] = None
+    fastspell_mode: str = "aggr"
+    source_tokenizer_command: Optional[str] = None
+    target_tokenizer_command: Optional[str] = None
+    cache_size: int = 64
+    adaptive_order: int = 0
+
+    def __post_init__(self):
+        if isinstance(self.rules_config, str):
+            import yaml
+            with open(self.rules_config) as f:
+                self.rules_config = yaml.safe_load(f)
+
+        if self.metadata is not None and self.metadata_yaml is None:
+            import yaml
+            metadata_path = real_metadata_path(self.metadata)
+            with open(metadata_path) as f:
+                self.metadata_yaml = yaml.safe_load(f)
+            self.metadata_yaml["yamldir"] = os.path.dirname(os.path.abspath(metadata_path))
+
+        metadata = self.metadata_yaml
+        if metadata is None:
+            self.disable_lm_filter = True
+            self.disable_porn_removal = True
+        else:
+            if self.source_lang is None:
+                self.source_lang = metadata.get("source_lang")
+            if self.target_lang is None:
+                self.target_lang = metadata.get("target_lang")
+            if self.source_tokenizer_command is None:
+                self.source_tokenizer_command = metadata.get("source_tokenizer_command")
+            if self.target_tokenizer_command is None:
+                self.target_tokenizer_command = metadata.get("target_tokenizer_command")
+            if not self.disable_lm_filter and not ("source_lm" in metadata and "target_lm" in metadata):
+                logging.warning("LM file not present in metadata.")
+                self.disable_lm_filter = True
+            if not self.disable_porn_removal and "porn_removal_file" not in metadata:
+                logging.warning("Porn removal classifier not present in metadata.")
+                self.disable_porn_removal = True
+
+        if self.source_lang is None or self.target_lang is None:
+            raise ValueError("No source or target languages provided.")
+
+    def __getattr__(self, name):
+        # Only called for attributes not set yet
+        if name == 'porn_removal':
+            self.porn_removal = None if self.disable_porn_removal else load_porn_removal(self.metadata_yaml)
+            return self.porn_removal
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+    def __getstate__(self):
+        # Models are loaded again by each process
+        state = dict(self.__dict__)
+        state.pop('porn_removal', None)
+        return state
+
+
+class Verdict(NamedTuple):
+    ''' Verdict of a sentence pair: keep or not and the rules that discarded it, if any '''
+    keep: bool
+    reasons: List[str]
+
+
+def classify(hardrules: Hardrules, pairs: Sequence, dont_ignore_long: bool = False) -> List[Verdict]:
+    ''' Verdicts of a list of (source, target) pairs, in the same order '''
+    verdicts = [None] * len(pairs)
+    positions = []
+    lefts = []
+    rights = []
+    for i, pair in enumerate(pairs):
+        left, right = pair[0], pair[1]
+        if not dont_ignore_long and (len(left) > ignore_length or len(right) > ignore_length):
+            verdicts[i] = Verdict(False, ["not_too_long"])
+            continue
+        positions.append(i)
+        lefts.append(left)
+        rights.append(right)
+
+    keeps, reasons = hardrules.wrong_tu_batch(lefts, rights)
+    for i, keep, code in zip(positions, keeps, reasons):
+        verdicts[i] = Verdict(bool(keep), hardrules.reason_labels(code) if not keep else [])
+    return verdicts
+
+# Configuration and Hardrules of each worker of the pool, loaded with the first chunk
+# so errors loading the models are raised by filter_pairs instead of killing the worker
+worker_config = None
+worker_hardrules = None
+
+def init_worker(config):
+    global worker_config
+    worker_config = config
+
+def classify_chunk(pairs):
+    global worker_hardrules
+    if worker_hardrules is None:
+        worker_hardrules = Hardrules(worker_config)
+    return classify(worker_hardrules, pairs, worker_config.dont_ignore_long)
+
+def chunks(pairs, chunk_size):
+    iterator = iter(pairs)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+def filter_pairs(pairs: Iterable, config: Optional[HardrulesConfig] = None,
+                 processes: int = 1, chunk_size: int = 1000, **options) -> Iterator[Verdict]:
+    '''
+    Apply the rules to an iterable of (source, target) pairs, yielding one Verdict per pair in the same order.
+    Options are passed to HardrulesConfig if no config is given.
+    With more than one process, chunks of chunk_size pairs are classified by a pool of processes,
+    each one loading its own models. At most two chunks per process are read ahead of the
+    verdicts consumed, so the input can be a stream of any size.
+    '''
+    if config is None:
+        config = HardrulesConfig(**options)
+    elif options:
+        raise TypeError("Options can't be given together with a config")
+
+    if processes <= 1:
+        hardrules = Hardrules(config)
+        for chunk in chunks(pairs, chunk_size):
+            yield from classify(hardrules, chunk, config.dont_ignore_long)
+        return
+
+    preflight(config)
+    with Pool(processes, initializer=init_worker, initargs=(config,)) as pool:
+        pending = deque()
+        for chunk in chunks(pairs, chunk_size):
+            pending.append(pool.apply_async(classify_chunk, (chunk,)))
+            if len(pending) >= 2 * processes:
+                yield from pending.popleft().get()
+        while pending:
+            yield from pending.popleft().get()
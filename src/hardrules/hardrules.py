@@ -2,26 +2,25 @@ import sys
 import logging
 import regex
 import re
-import os
-import sys
+import ahocorasick
 
-from unicodedata import category as cat
-from fastspell import FastSpell
+from array import array
 from collections import OrderedDict
+from functools import partial
+from itertools import islice
 from inspect import getmembers, signature
 from copy import deepcopy
+from timeit import default_timer
 
 try:
-    from .lm import load_lm_filter
-    from .tokenizer import Tokenizer
-    from .writing_scripts import script_family
+    from .writing_scripts import script_families, non_letters_regex
+    from .result_cache import ResultCache
+    from .rule_stats import RuleStats
 except (SystemError, ImportError):
-    from lm import load_lm_filter
-    from tokenizer import Tokenizer
-    from writing_scripts import script_family
+    from writing_scripts import script_families, non_letters_regex
+    from result_cache import ResultCache
+    from rule_stats import RuleStats
 
-tbl_non_alpha = [chr(i) for i in range(sys.maxunicode) if not cat(chr(i)).startswith('L')]
-tbl_non_alpha = str.maketrans('', '', ''.join(tbl_non_alpha))
 regex_blank = regex.compile("[ \u00A0]")
 regex_alpha = regex.compile("[[:alpha:]]")
 regex_numbers = regex.compile("[[:digit:]]")
@@ -53,6 +52,126 @@ acumflex_langs = {"cy", "fr", "fa", "it", "pt", "tr", "vi", "lij", "ro"}
 relaxed_unicode_langs = ('is', 'fi', 'az')
 CJK = {"zh", "ja", "ko", "yue", "bo", "bod", "cmn", "zho", "jpn", "kor"}
 
+def map_column(rule, *columns):
+    ''' Default batch version of a rule: apply it to each element of the columns '''
+    return list(map(rule, *columns))
+
+regex_non_alpha = regex.compile("[^[:alpha:]]+")
+regex_non_numbers = regex.compile("[^[:digit:]]+")
+# Matches if and only if regex_glued_words does: the leading [[:alpha:]]* can be skipped by starting
+# the match later and the last [[:lower:]]+ shortened to one char, which avoids trying [[:alpha:]]* at every position
+regex_glued_words_search = regex.compile("[[:upper:]][[:lower:]]+[[:alpha:]]*?[[:upper:]][[:lower:]]")
+
+class PredictedModel:
+    ''' Stands for a fasttext model, answering with predictions already made for a batch of texts '''
+
+    def __init__(self, model, predictions):
+        self.model = model
+        self.predictions = predictions
+
+    def predict(self, text, k=1):
+        if k == 1 and text in self.predictions:
+            return self.predictions[text]
+        return self.model.predict(text, k=k)
+
+def load_fastspell(langs, mode="aggr"):
+    '''
+    FastSpell objects for each language, sharing one fasttext langid model.
+    Each FastSpell loads its own copy of the model otherwise.
+    '''
+    from fastspell import FastSpell
+    shared = {}
+
+    class BatchFastSpell(FastSpell):
+        def download_fasttext(self):
+            if 'model' in shared:
+                self.model = shared['model']
+            else:
+                super().download_fasttext()
+                shared['model'] = self.model
+
+        def getlangs(self, sentences):
+            '''
+            Same as getlang for each sentence, with one fasttext call for all of them.
+            Hunspell refinement is still done by getlang, only for predictions of similar languages.
+            '''
+            # Same normalization getlang does before predicting, repeated sentences are predicted once
+            texts = list(dict.fromkeys(sentence.replace("\n", " ").strip().lower() for sentence in sentences))
+            labels, probabilities = self.model.predict(texts, k=1)
+            model = self.model
+            self.model = PredictedModel(model, dict(zip(texts, zip(labels, probabilities))))
+            try:
+                return [self.getlang(sentence) for sentence in sentences]
+            finally:
+                self.model = model
+
+    return [BatchFastSpell(lang, mode=mode) for lang in langs]
+
+def build_automaton(literals):
+    ''' Aho-Corasick automaton that finds any of the literals in a single pass over the sentence '''
+    automaton = ahocorasick.Automaton()
+    for literal in literals:
+        automaton.add_word(literal, literal)
+    automaton.make_automaton()
+    return automaton
+
+def fewer_matches(pattern, sentence, count):
+    ''' Same as len(pattern.findall(sentence)) < count, but stops searching at the count-th match '''
+    return next(islice(pattern.finditer(sentence), count - 1, None), None) is None
+
+class NoiseScanner:
+    '''
+    Evaluates the enabled regex based per-side rules for one language in a single call per sentence.
+    Match lists are never built: existence checks stop at the first match,
+    counts stop when the threshold is reached and character classes are counted with one substitution.
+    Verdicts are cached, so running the rules one after the other scans each sentence once.
+    '''
+    rules = ('no_only_symbols', 'no_only_numbers', 'no_urls', 'no_breadcrumbs',
+             'no_glued_words', 'no_unicode_noise', 'no_space_noise', 'no_escaped_unicode')
+    # Sentences with cached verdicts, enough for a whole block
+    max_cached = 65536
+
+    def __init__(self, lang, enabled):
+        numbers_threshold = 0.7 if lang in CJK else 0.5
+        # Icelandic can have words with three or four high unicode values like 'þýðir'
+        # Finish and Azerbaijani sometimes too
+        if lang in relaxed_unicode_langs:
+            unicode_noise_search = regex_unicode_noise_relaxed.search
+        else:
+            unicode_noise_search = regex_unicode_noise.search
+
+        checks = {
+            'no_only_symbols': lambda sentence: len(sentence) == 0 \
+                    or len(regex_non_alpha.sub('', sentence)) / len(sentence) > 0.1,
+            'no_only_numbers': lambda sentence: len(sentence) == 0 \
+                    or len(regex_non_numbers.sub('', sentence)) / len(sentence) < numbers_threshold,
+            'no_urls': lambda sentence: regex_url.search(sentence) is None,
+            'no_breadcrumbs': lambda sentence: fewer_matches(regex_breadcrumbs2, sentence, 2) \
+                    or fewer_matches(regex_breadcrumbs1, sentence, 3),
+            'no_glued_words': lambda sentence: regex_glued_words_search.search(sentence) is None,
+            'no_unicode_noise': lambda sentence: unicode_noise_search(sentence) is None,
+            'no_space_noise': lambda sentence: regex_spaces_noise.search(sentence) is None,
+            'no_escaped_unicode': lambda sentence: regex_escaped_unicode.search(sentence) is None,
+        }
+        self.enabled = [name for name in self.rules if name in enabled]
+        self.index = {name: i for i, name in enumerate(self.enabled)}
+        self.checks = [checks[name] for name in self.enabled]
+        self.cache = {}
+
+    def rule(self, name):
+        ''' Callable returning the verdict of one rule for a sentence '''
+        i = self.index[name]
+        return lambda sentence: self.scan(sentence)[i]
+
+    def scan(self, sentence):
+        ''' Verdicts of the enabled rules, True if the sentence is kept '''
+        verdicts = self.cache.get(sentence)
+        if verdicts is None:
+            if len(self.cache) >= self.max_cached:
+                self.cache.clear()
+            verdicts = self.cache[sentence] = tuple([check(sentence) for check in self.checks])
+        return verdicts
+
 class Hardrules():
     # Define default settings
     # the order of execution will be the order of the dict
@@ -82,17 +201,53 @@ class Hardrules():
     rule_pipeline['lm_filter'] = True
     
     def __init__(self, args):
-        # Load LM
-        if not args.disable_lm_filter:
+        self.src_lang = args.source_lang
+        self.trg_lang = args.target_lang
+        self.run_all_rules = args.run_all_rules
+        self.disable_minimal_length = args.disable_minimal_length
+        self.rules = {n: f for n, f in getmembers(self) if n.startswith('c_')}
+        logging.debug(f"Available rules: {self.rules.keys()}")
+
+        # Create dict with with config
+        self.config = deepcopy(self.rule_pipeline)
+        if args.rules_config is not None:
+            # Validate config
+            dif = args.rules_config.keys() - self.rule_pipeline.keys()
+            if dif:
+                raise Exception(f"Unkown options in config: {dif}")
+
+            # Overwrite with user-defined options
+            for name, param in args.rules_config.items():
+                self.config[name] = param
+
+        logging.debug(f"Enabled rules: {self.config.keys()}")
+
+        # Check that all the rule functions are implemented
+        for rule_name in self.config.keys():
+            if 'c_' + rule_name not in self.rules:
+                raise NotImplementedError(f"Rule {rule_name} is not implemented")
+
+        # Models and the modules they need are only loaded for enabled rules,
+        # importing them is a large part of the startup time
+        if not args.disable_lm_filter and self.config['lm_filter']:
+            try:
+                from .lm import load_lm_filter
+            except (SystemError, ImportError):
+                from lm import load_lm_filter
             self.lm_filter = load_lm_filter(args.source_lang,
                     args.target_lang, args.metadata_yaml,
-                    args.source_tokenizer_command, args.target_tokenizer_command)
+                    args.source_tokenizer_command, args.target_tokenizer_command,
+                    getattr(args, 'lm_load_method', None))
         else:
             self.lm_filter = None
         self.lm_threshold = args.lm_threshold
 
         # Load porn removal
-        if not args.disable_porn_removal:
+        if not args.disable_porn_removal and self.config['no_porn']:
+            try:
+                from .tokenizer import Tokenizer
+            except (SystemError, ImportError):
+                from tokenizer import Tokenizer
             try:
                 self.porn_removal_side = args.metadata_yaml['porn_removal_side']
                 self.porn_removal = args.porn_removal
@@ -111,46 +266,120 @@ class Hardrules():
             self.porn_removal_side = None
 
         # Load FastSpell
-        if not args.disable_lang_ident:
-            self.fastspell_src = FastSpell(args.source_lang, mode="aggr")
-            self.fastspell_trg = FastSpell(args.target_lang, mode="aggr")
+        if not args.disable_lang_ident and self.config['no_wrong_language']:
+            self.fastspell_src, self.fastspell_trg = load_fastspell([args.source_lang, args.target_lang],
+                    getattr(args, 'fastspell_mode', "aggr"))
         else:
             self.fastspell_src = None
             self.fastspell_trg = None
 
-
-        self.src_lang = args.source_lang
-        self.trg_lang = args.target_lang
-        self.run_all_rules = args.run_all_rules
-        self.disable_minimal_length = args.disable_minimal_length
-        self.rules = {n: f for n, f in getmembers(self) if n.startswith('c_')}
-        logging.debug(f"Available rules: {self.rules.keys()}")
-
-        # Create dict with with config
-        self.config = deepcopy(self.rule_pipeline)
-        if args.rules_config is not None:
-            # Validate config
-            dif = args.rules_config.keys() - self.rule_pipeline.keys()
-            if dif:
-                raise Exception(f"Unkown options in config: {dif}")
-
-            # Overwrite with user-defined options
-            for name, param in args.rules_config.items():
-                self.config[name] = param
-
-        logging.debug(f"Enabled rules: {self.config.keys()}")
-
-        # Check that all the rule functions are implemented
-        for rule_name in self.config.keys():
-            if 'c_' + rule_name not in self.rules:
-                raise NotImplementedError(f"Rule {rule_name} is not implemented")
-
         # Check if user wants to carry out wrong language filtering
         # using a specified sentence length or not
         self.lang_check = False
         if self.config['no_wrong_language'] == 1 or self.config['no_wrong_language'] == True:
             self.lang_check = True
 
+        # Literals are searched all at once, matching time does not grow with the number of literals
+        self.literals = None
+        if self.config['no_literals']:
+            self.literals = build_automaton(literal for literal in self.config['no_literals'] if literal)
+
+        # Results of the model-backed rules for repeated sentences
+        self.result_cache = ResultCache(getattr(args, 'cache_size', 64))
+
+        # Regex based rules of each side evaluated together
+        enabled = [name for name, param in self.config.items() if param]
+        self.noise_scanners = {side: NoiseScanner(self.side_lang(side), enabled) for side in ('left', 'right')}
+
+        # Resolve logging level once, debug messages are expensive to build per TU
+        self.debug = logging.getLogger().isEnabledFor(logging.DEBUG)
+
+        # Pairs evaluated by every rule to measure their cost and rejection rate,
+        # then wrong_tu_batch runs the steps in the order that is cheaper for this corpus
+        self.adaptive_sample = 0 if self.run_all_rules else getattr(args, 'adaptive_order', 0)
+        # Finding the first rule in pipeline order that discards a pair costs more with other orders,
+        # it is only done when the reasons are written
+        self.exact_reasons = getattr(args, 'annotated_output', True) or getattr(args, 'verdict_store', None) is not None
+
+        # Per rule statistics, only collected when requested
+        self.stats = None
+        self.recompile()
+        if getattr(args, 'stats_file', None) or getattr(args, 'profile_rules', False):
+            self.stats = RuleStats(self.labels, timing=getattr(args, 'profile_rules', False))
+
+    def recompile(self):
+        '''
+        Build the execution plan and reset everything that depends on it.
+        Call it again after replacing the models or settings the rules are bound to.
+        '''
+        self.pipeline = self.compile_pipeline()
+        # Reason codes are bitmasks over the pipeline steps, so they keep the pipeline order
+        self.labels = [step[1] for step in self.pipeline]
+        self.empty_codes = {step[2]: 1 << n for n, step in enumerate(self.pipeline) if step[0] == 'no_empty'}
+        logging.debug(f"Compiled pipeline: {self.labels}")
+
+        self.order = None
+        self.sampled = 0
+        self.step_time = [0.0] * len(self.pipeline)
+        self.step_calls = [0] * len(self.pipeline)
+        self.step_rejects = [0] * len(self.pipeline)
+        # The first noise scanner step of a side scans the whole sentence and the rest read the cache,
+        # so those steps are measured and ordered together as one group
+        self.step_groups = [('scanner', step[2]) if step[2] is not None and step[0] in self.noise_scanners[step[2]].index
+                            else n for n, step in enumerate(self.pipeline)]
+        self.group_rejects = dict.fromkeys(self.step_groups, 0)
+
+        if self.stats is not None:
+            self.stats = RuleStats(self.labels, timing=self.stats.timing)
+
+    def compile_pipeline(self):
+        '''
+        Build the ordered list of steps that wrong_tu and wrong_tu_batch execute.
+        Each step is a tuple (rule_name, label, side, rule, batch_rule) where side is
+        'left' or 'right' for rules applied to each side separately, taking one sentence,
+        or None for rules applied to the pair, taking left and right.
+        batch_rule does the same over whole columns and returns a list of keep flags,
+        rules can provide their own with a _bind_batch_<rule> method.
+        Disabled rules and rules that cannot discard with the current setup are left out.
+        '''
+        pipeline = []
+        for rule_name, param in self.config.items():
+            if not param:
+                continue
+
+            rule_func = self.rules['c_' + rule_name]
+            binder = getattr(self, '_bind_' + rule_name, None)
+            batch_binder = getattr(self, '_bind_batch_' + rule_name, None)
+
+            # Determine if rule has to be applied to both sides separated, or together
+            if 'sentence' in signature(rule_func).parameters:
+                for side in ('left', 'right'):
+                    if binder is None:
+                        rule = partial(rule_func, side=side)
+                    else:
+                        rule = binder(side)
+                    if rule is None:
+                        break
+                    if batch_binder is None:
+                        batch_rule = partial(map_column, rule)
+                    else:
+                        batch_rule = batch_binder(side)
+                    pipeline.append((rule_name, f"{rule_name}({side})", side, rule, batch_rule))
+            else:
+                rule = rule_func if binder is None else binder()
+                if rule is None:
+                    continue
+                if batch_binder is None:
+                    batch_rule = partial(map_column, rule)
+                else:
+                    batch_rule = batch_binder()
+                pipeline.append((rule_name, f"{rule_name}(left,right)", None, rule, batch_rule))
+
+        return pipeline
+
+    def side_lang(self, side):
+        return self.trg_lang if side == 'right' else self.src_lang
+
     def wrong_tu(self, left, right):
         # Create list of discard tags
         # for each rule that triggers discard
@@ -158,50 +387,215 @@ class Hardrules():
         if self.run_all_rules:
             discards = []
 
-        logging.debug(f"{left}\t{right}")
+        if self.debug:
+            logging.debug(f"{left}\t{right}")
 
-        # Loop over rule pipeline
-        for rule_name in self.config.keys():
-            if not self.config[rule_name]:
-                continue
+        # Loop over compiled rule pipeline
+        for rule_name, label, side, rule, _ in self.pipeline:
+            if side == 'left':
+                keep = rule(left)
+            elif side == 'right':
+                keep = rule(right)
+            else:
+                keep = rule(left, right)
 
-            # Obtain function to be applied
-            rule_func = self.rules['c_' + rule_name]
+            if self.debug:
+                logging.debug(f"Rule '{label}': {not keep}")
 
-            # Determine if rule has to be applied to both sides separated, or together
-            #TODO is reflection slow?
-            if 'sentence' in signature(rule_func).parameters:
-                # Iterate over left and right side
-                for sidename, side in {'left': left, 'right': right}.items():
-                    keep = rule_func(side, sidename)
-                    logging.debug(f"Rule '{rule_name}({sidename})': {not keep}")
-                    if not keep and self.run_all_rules:
-                        # Especial case for empty rule to avoid crashes in other rules
-                        if rule_name == 'no_empty':
-                            #check if both are empty:
-                            if left=="":
-                                discards.append("no_empty(left)")
-                            if right=="":
-                                discards.append("no_empty(right)")
-                            return discards
-                        else:   
-                            discards.append(f"{rule_name}({sidename})")                            
-                    elif not keep:
-                        return f"{rule_name}({sidename})"
-            else:
-                # Apply rule to both sides
-                keep = rule_func(left, right)
-                logging.debug(f"Rule '{rule_name}(left,right)': {not keep}")
-                if not keep and self.run_all_rules:
-                    discards.append(f"{rule_name}(left,right)")
-                elif not keep:
-                    return f"{rule_name}(left,right)"
+            if keep:
+                continue
+            if not self.run_all_rules:
+                return label
+
+            # Especial case for empty rule to avoid crashes in other rules
+            if rule_name == 'no_empty':
+                #check if both are empty:
+                if left=="":
+                    discards.append("no_empty(left)")
+                if right=="":
+                    discards.append("no_empty(right)")
+                return discards
+            discards.append(label)
 
         if self.run_all_rules and discards:
             return discards
         else:
             return False
 
+    def run_step(self, n, lefts, rights, pairs, extra=False):
+        '''
+        Keep flags of the pipeline step n for the pairs with the given positions.
+        extra is set outside the pipeline, when sampling the order or finding the reasons.
+        '''
+        side, batch_rule = self.pipeline[n][2], self.pipeline[n][4]
+        if side == 'left':
+            columns = ([lefts[i] for i in pairs],)
+        elif side == 'right':
+            columns = ([rights[i] for i in pairs],)
+        else:
+            columns = ([lefts[i] for i in pairs], [rights[i] for i in pairs])
+
+        stats = self.stats
+        if stats is None:
+            return batch_rule(*columns)
+        if extra:
+            stats.extra_calls[n] += len(pairs)
+        else:
+            stats.calls[n] += len(pairs)
+        if not stats.timing:
+            return batch_rule(*columns)
+        start = default_timer()
+        keeps = batch_rule(*columns)
+        if extra:
+            stats.extra_time[n] += default_timer() - start
+        else:
+            stats.add_time(n, len(pairs), default_timer() - start)
+        return keeps
+
+    def wrong_tu_batch(self, lefts, rights):
+        '''
+        Apply the rules to a block of sentence pairs, one rule at a time over the whole column.
+        Returns two arrays with one position per pair: verdicts (1 keep, 0 discard)
+        and reason codes (0 if kept), decode them with reason_labels.
+        Same results as calling wrong_tu on each pair, reasons of the adaptive order
+        only if exact_reasons is set.
+        '''
+        size = len(lefts)
+        verdicts = array('B', [1]) * size
+        reasons = array('Q', [0]) * size
+        if self.sampled < self.adaptive_sample:
+            self.sample_batch(lefts, rights, verdicts, reasons)
+        else:
+            self.run_pipeline(lefts, rights, verdicts, reasons)
+
+        if self.stats is not None:
+            self.stats.add_verdicts(verdicts, reasons)
+        return verdicts, reasons
+
+    def run_pipeline(self, lefts, rights, verdicts, reasons):
+        # Pairs that still have to go through the rest of the pipeline
+        alive = list(range(len(lefts)))
+        for n in range(len(self.pipeline)) if self.order is None else self.order:
+            if not alive:
+                break
+
+            rule_name = self.pipeline[n][0]
+            keeps = self.run_step(n, lefts, rights, alive)
+            code = 1 << n
+            survivors = []
+            for i, keep in zip(alive, keeps):
+                if keep:
+                    survivors.append(i)
+                    continue
+                verdicts[i] = 0
+                if not self.run_all_rules:
+                    reasons[i] = code
+                elif rule_name == 'no_empty':
+                    # Especial case for empty rule to avoid crashes in other rules
+                    if lefts[i] == "":
+                        reasons[i] |= self.empty_codes['left']
+                    if rights[i] == "":
+                        reasons[i] |= self.empty_codes['right']
+                else:
+                    reasons[i] |= code
+                    survivors.append(i)
+            alive = survivors
+
+        if self.order is not None and self.exact_reasons:
+            self.resolve_reasons(lefts, rights, reasons)
+
+    def sample_batch(self, lefts, rights, verdicts, reasons):
+        '''
+        Apply every rule to every pair of the block, measuring the time and rejections of each step.
+        Pairs with an empty side are not passed to the rest of the rules, some of them would crash.
+        Verdicts and reasons are the same as wrong_tu_batch without run_all_rules.
+        Once enough pairs are sampled the steps are reordered.
+        '''
+        alive = list(range(len(lefts)))
+        # Pairs discarded by each group of steps, a pair counts once per group
+        discarded = {group: set() for group in self.group_rejects}
+        for n, step in enumerate(self.pipeline):
+            if not alive:
+                break
+
+            start = default_timer()
+            keeps = self.run_step(n, lefts, rights, alive, extra=True)
+            self.step_time[n] += default_timer() - start
+            self.step_calls[n] += len(alive)
+
+            code = 1 << n
+            survivors = []
+            for i, keep in zip(alive, keeps):
+                if keep:
+                    survivors.append(i)
+                    continue
+                self.step_rejects[n] += 1
+                discarded[self.step_groups[n]].add(i)
+                if verdicts[i]:
+                    verdicts[i] = 0
+                    reasons[i] = code
+                if step[0] != 'no_empty':
+                    survivors.append(i)
+            alive = survivors
+
+        for group, pairs in discarded.items():
+            self.group_rejects[group] += len(pairs)
+        self.sampled += len(lefts)
+        if self.sampled >= self.adaptive_sample:
+            self.order = self.adapted_order()
+            logging.info(f"Adaptive rule order after {self.sampled} pairs: {[self.labels[n] for n in self.order]}")
+
+    def adapted_order(self):
+        '''
+        Order of the pipeline steps with the lowest expected cost per pair, given the measured
+        cost and rejection rate of each step: increasing time per rejected pair.
+        Noise scanner steps of a side share one scan, they are ordered as a group by its total time
+        and keep their pipeline order inside it.
+        no_empty steps stay first, other rules rely on them. Steps that rejected nothing keep their order.
+        '''
+        pinned = [n for n, step in enumerate(self.pipeline) if step[0] == 'no_empty']
+        groups = {}
+        for n, group in enumerate(self.step_groups):
+            if n not in pinned:
+                groups.setdefault(group, []).append(n)
+
+        def cost(group):
+            rejects = self.group_rejects[group]
+            return sum(self.step_time[n] for n in groups[group]) / rejects if rejects else float('inf')
+
+        return pinned + [n for group in sorted(groups, key=cost) for n in groups[group]]
+
+    def resolve_reasons(self, lefts, rights, reasons):
+        '''
+        Reasons of the adaptive order are the first step of that order that discards each pair.
+        Replace them with the first discarding step in pipeline order,
+        running the steps before it in pipeline order that were skipped.
+        '''
+        position = {n: p for p, n in enumerate(self.order)}
+        groups = {}
+        for i, code in enumerate(reasons):
+            if code:
+                groups.setdefault(code.bit_length() - 1, []).append(i)
+
+        for n, pairs in groups.items():
+            for m in range(n):
+                if not pairs:
+                    break
+                if position[m] < position[n]:
+                    # Already passed by these pairs
+                    continue
+                survivors = []
+                for i, keep in zip(pairs, self.run_step(m, lefts, rights, pairs, extra=True)):
+                    if keep:
+                        survivors.append(i)
+                    else:
+                        reasons[i] = 1 << m
+                pairs = survivors
+
+    def reason_labels(self, code):
+        ''' List the names of the rules that discarded a pair given its reason code '''
+        return [label for n, label in enumerate(self.labels) if code >> n & 1]
+
     def c_no_empty(self, sentence, side):
         return sentence != ""
 
@@ -214,65 +608,115 @@ class Hardrules():
         return len(sentence) < self.config['not_too_long']
 
     def c_not_too_short(self, sentence, side):
-        lang = self.src_lang
-        if side == "right":
-            lang = self.trg_lang
+        rule = self._bind_not_too_short(side)
+        return rule is None or rule(sentence)
 
+    def _bind_not_too_short(self, side):
         if self.disable_minimal_length:
-            return True
+            return None
 
+        min_length = self.config['not_too_short']
         # for Chinese, Japanese and Korean characters rather than words are used
-        if lang in CJK:
-            return len(sentence) >= self.config['not_too_short']
+        if self.side_lang(side) in CJK:
+            return lambda sentence: len(sentence) >= min_length
 
         """ Counts number of whitespace, requires >= 2 (3 words) """
-        return len(regex_blank.findall(sentence)) >= self.config['not_too_short']-1
+        return lambda sentence: len(regex_blank.findall(sentence)) >= min_length-1
 
     def c_no_identical(self, left, right):
-        left = left.translate(tbl_non_alpha)
-        right = right.translate(tbl_non_alpha)
-        return left.casefold() != right.casefold()
+        return self._bind_no_identical()(left, right)
+
+    def _bind_no_identical(self):
+        # Compare only the letters
+        strip = partial(non_letters_regex().sub, '')
+        return lambda left, right: strip(left).casefold() != strip(right).casefold()
 
     def c_length_ratio(self, left, right):
+        return self._bind_length_ratio()(left, right)
+
+    def _bind_length_ratio(self):
         lower_ratio = 1/self.config["length_ratio"]
         upper_ratio = self.config["length_ratio"]
         if self.src_lang in CJK or self.trg_lang in CJK:
-            return lower_ratio <= len(left.encode("utf8"))/len(right.encode("utf8")) <= upper_ratio
+            return lambda left, right: lower_ratio <= len(left.encode("utf8"))/len(right.encode("utf8")) <= upper_ratio
         else:
-            return lower_ratio <= len(left)/len(right) <= upper_ratio
+            return lambda left, right: lower_ratio <= len(left)/len(right) <= upper_ratio
 
     def c_no_wrong_language(self, sentence, side='left'):
-        if len(sentence) == 0:
-            return True
-        
+        rule = self._bind_no_wrong_language(side)
+        return rule is None or rule(sentence)
+
+    def _bind_no_wrong_language(self, side):
         if self.fastspell_src is None:
-            return True
+            return None
 
-        # Check wrong language only if the length in characters is higher than the value set by the user
-        if self.lang_check or len(sentence) >= self.config['no_wrong_language']:
-            if side == 'left':
-                lang = self.src_lang
-                fastspell = self.fastspell_src
-            else:
-                lang = self.trg_lang
-                fastspell = self.fastspell_trg
+        lang = self.side_lang(side)
+        fastspell = self.fastspell_trg if side == 'right' else self.fastspell_src
+        min_length = self._wrong_language_min_length()
+        getlang = self.result_cache.wrap(f'no_wrong_language({side})', fastspell.getlang)
 
-            return fastspell.getlang(sentence) == lang
-        return True
+        def rule(sentence):
+            if len(sentence) < min_length:
+                return True
+            return getlang(sentence) == lang
+        return rule
+
+    def _bind_batch_no_wrong_language(self, side):
+        lang = self.side_lang(side)
+        fastspell = self.fastspell_trg if side == 'right' else self.fastspell_src
+        min_length = self._wrong_language_min_length()
+        getlangs = self.result_cache.wrap_batch(f'no_wrong_language({side})', fastspell.getlangs)
+
+        def batch_rule(sentences):
+            keeps = [True] * len(sentences)
+            checked = [i for i, sentence in enumerate(sentences) if len(sentence) >= min_length]
+            if checked:
+                langs = getlangs([sentences[i] for i in checked])
+                for i, detected in zip(checked, langs):
+                    keeps[i] = detected == lang
+            return keeps
+        return batch_rule
+
+    def _wrong_language_min_length(self):
+        # Check wrong language only if the length in characters is higher than the value set by the user
+        return 1 if self.lang_check else max(1, self.config['no_wrong_language'])
 
     def c_lm_filter(self, left, right):
+        rule = self._bind_lm_filter()
+        return rule is None or rule(left, right)
+
+    def _bind_lm_filter(self):
         if self.lm_filter is None:
-            return True
-        return self.lm_filter.score(left, right) >= self.lm_threshold
+            return None
+        # Same as lm_filter.score, with each side's score cached
+        perplexity_to_score = self.lm_filter.scoring_stats.perplexity_to_score
+        sl_score = self.result_cache.wrap('lm_filter(left)', self.lm_filter.sl_filter.score)
+        tl_score = self.result_cache.wrap('lm_filter(right)', self.lm_filter.tl_filter.score)
+        lm_threshold = self.lm_threshold
+        return lambda left, right: perplexity_to_score(sl_score(left) + tl_score(right)) >= lm_threshold
+
+    def _bind_batch_lm_filter(self):
+        perplexity_to_score = self.lm_filter.scoring_stats.perplexity_to_score
+        sl_scores = self.result_cache.wrap_batch('lm_filter(left)', self.lm_filter.sl_filter.score_batch)
+        tl_scores = self.result_cache.wrap_batch('lm_filter(right)', self.lm_filter.tl_filter.score_batch)
+        lm_threshold = self.lm_threshold
+
+        def batch_rule(lefts, rights):
+            return [perplexity_to_score(sl + tl) >= lm_threshold for sl, tl in zip(sl_scores(lefts), tl_scores(rights))]
+        return batch_rule
 
     def c_no_bad_encoding(self, sentence, side):
-        lang = self.src_lang if side == 'left' else self.trg_lang
-
-        if lang not in atilde_langs and 'Ã' in sentence:
-            return False
-        if lang not in acumflex_langs and 'Â' in sentence:
-            return False
-        return True
+        return self._bind_no_bad_encoding(side)(sentence)
+
+    def _bind_no_bad_encoding(self, side):
+        lang = self.side_lang(side)
+        # Look only for the mojibake characters that are not valid in this language
+        bad_chars = []
+        if lang not in atilde_langs:
+            bad_chars.append('Ã')
+        if lang not in acumflex_langs:
+            bad_chars.append('Â')
+        return lambda sentence: not any(c in sentence for c in bad_chars)
 
     def c_no_only_symbols(self, sentence, side):
         if len(sentence) == 0:
@@ -283,7 +727,7 @@ class Hardrules():
         if len(sentence) == 0:
             return True
         
-        lang = self.src_lang if side == 'left' else self.trg_lang
+        lang = self.side_lang(side)
         threshold = 0.5
         if lang in CJK:
             threshold = 0.7
@@ -299,9 +743,7 @@ class Hardrules():
                 or len(regex_breadcrumbs2.findall(sentence)) < 2
 
     def c_no_unicode_noise(self, sentence, side):
-        lang = self.src_lang
-        if side == "right":
-            lang = self.trg_lang
+        lang = self.side_lang(side)
 
         # Icelandic can have words with three or four high unicode values like 'þýðir'
         # Finish and Azerbaijani sometimes too
@@ -313,6 +755,32 @@ class Hardrules():
     def c_no_space_noise(self, sentence, side):
         return len(regex_spaces_noise.findall(sentence)) == 0
 
+    # The compiled pipeline evaluates these rules with the side's NoiseScanner,
+    # the c_ methods above are the reference implementation
+    def _bind_no_only_symbols(self, side):
+        return self.noise_scanners[side].rule('no_only_symbols')
+
+    def _bind_no_only_numbers(self, side):
+        return self.noise_scanners[side].rule('no_only_numbers')
+
+    def _bind_no_urls(self, side):
+        return self.noise_scanners[side].rule('no_urls')
+
+    def _bind_no_breadcrumbs(self, side):
+        return self.noise_scanners[side].rule('no_breadcrumbs')
+
+    def _bind_no_glued_words(self, side):
+        return self.noise_scanners[side].rule('no_glued_words')
+
+    def _bind_no_unicode_noise(self, side):
+        return self.noise_scanners[side].rule('no_unicode_noise')
+
+    def _bind_no_space_noise(self, side):
+        return self.noise_scanners[side].rule('no_space_noise')
+
+    def _bind_no_escaped_unicode(self, side):
+        return self.noise_scanners[side].rule('no_escaped_unicode')
+
     def c_no_paren(self,left, right):
         if len(re.findall(regex_paren, left)) or len(re.findall(regex_paren, right)): #there are parentheses
             l_char_count = {i: left.count(i) for i in set(left)}
@@ -343,7 +811,17 @@ class Hardrules():
 
 
     def c_no_literals(self, sentence, side):
-        return not any(l in sentence for l in self.config["no_literals"])
+        return self._bind_no_literals(side)(sentence)
+
+    def _bind_no_literals(self, side):
+        # No literals to look for, the compiled pipeline leaves the rule out
+        if self.literals is None:
+            return lambda sentence: True
+        # An empty literal is found in any sentence
+        if '' in self.config["no_literals"]:
+            return lambda sentence: False
+        matches = self.literals.iter
+        return lambda sentence: next(matches(sentence), None) is None
 
     def c_no_escaped_unicode(self, sentence, side):
         return len(regex_escaped_unicode.findall(sentence)) == 0
@@ -352,9 +830,10 @@ class Hardrules():
         return regex_glued_words.search(sentence) == None
 
     def c_no_repeated_words(self, sentence, side):
-        lang = self.src_lang
-        if side == "right":
-            lang = self.trg_lang
+        return self._bind_no_repeated_words(side)(sentence)
+
+    def _bind_no_repeated_words(self, side):
+        lang = self.side_lang(side)
 
         our_regex = regex_repeated_without_words
         if lang in safe_noise_detection_langs:
@@ -364,32 +843,63 @@ class Hardrules():
         if lang in CJK:
             min_chars = 4
 
-        count = 0
-        for match_obj in regex.finditer(our_regex, sentence):
-            matching = match_obj.group().strip()
-            # if match does not have a minimum length continue without discarding
-            if len(matching) > min_chars:
-                r2 = regex.search("[[:alpha:]]", matching)
-                if r2:
-                    # if a certain count of repeated patterns has been reached, then return False
-                    count += 1
-                    if count >= self.config['no_repeated_words']:
-                        return False
+        max_count = self.config['no_repeated_words']
+
+        def rule(sentence):
+            count = 0
+            for match_obj in our_regex.finditer(sentence):
+                matching = match_obj.group().strip()
+                # if match does not have a minimum length continue without discarding
+                if len(matching) > min_chars:
+                    r2 = regex_alpha.search(matching)
+                    if r2:
+                        # if a certain count of repeated patterns has been reached, then return False
+                        count += 1
+                        if count >= max_count:
+                            return False
 
-        return True
+            return True
+        return rule
 
     def c_no_porn(self, left, right):
+        rule = self._bind_no_porn()
+        return rule is None or rule(left, right)
+
+    def _bind_no_porn(self):
         if self.porn_removal is None:
-            return True
-    
-        if self.porn_removal_side == "sl":
-            tok = self.porn_tokenizer.tokenize(left.lower())
-        elif self.porn_removal_side == "tl":
-            tok = self.porn_tokenizer.tokenize(right.lower())
-        else:
+            return None
+
+        if self.porn_removal_side not in ("sl", "tl"):
             raise Exception(f"c_no_porn rule needs 'sl' or 'tl' param, not {self.porn_removal_side}")
+        porn_removal = self.porn_removal
+        porn_tokenizer = self.porn_tokenizer
+        use_left = self.porn_removal_side == "sl"
+
+        def is_clean(sentence):
+            tok = porn_tokenizer.tokenize(sentence.lower())
+            return porn_removal.predict(porn_tokenizer.detokenize(tok))[0][0] == '__label__negative'
+        is_clean = self.result_cache.wrap('no_porn', is_clean)
 
-        return self.porn_removal.predict(self.porn_tokenizer.detokenize(tok))[0][0] == '__label__negative'
+        def rule(left, right):
+            return is_clean(left if use_left else right)
+        return rule
+
+    def _bind_batch_no_porn(self):
+        porn_removal = self.porn_removal
+        porn_tokenizer = self.porn_tokenizer
+        use_left = self.porn_removal_side == "sl"
+
+        def are_clean(sentences):
+            # Tokenize the whole column and classify it with a single fasttext call
+            sentences = [sentence.lower() for sentence in sentences]
+            texts = [porn_tokenizer.detokenize(tok) for tok in porn_tokenizer.tokenize(sentences)]
+            labels, _ = porn_removal.predict(texts)
+            return [label[0] == '__label__negative' for label in labels]
+        are_clean = self.result_cache.wrap_batch('no_porn', are_clean)
+
+        def batch_rule(lefts, rights):
+            return are_clean(lefts if use_left else rights)
+        return batch_rule
 
 
     def c_no_number_inconsistencies(self, left, right):
@@ -405,21 +915,6 @@ class Hardrules():
             return False
         
     def c_no_script_inconsistencies(self, sentence, side):
-        found_script_family = ""
-        
-        for c in sentence:
-            if c.isalpha():
-                family = script_family(c)
-                if family == "":
-                    continue            
-                if found_script_family == "":
-                    #first char's script
-                    found_script_family =  family
-                    continue
-                if found_script_family != family:
-                    return False
-                else:
-                    continue
-    
-        return True                
+        # All the alphabetic characters with a script family have the same one
+        return len(script_families(sentence)) <= 1
         
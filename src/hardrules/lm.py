@@ -45,6 +45,21 @@ class UnicodeWordClassifier:
         return "OTHER"
             
 
+# KenLM load methods by name, for metadata and command line
+# lazy: memory map the model, pages are read from the page cache when used, so loading is almost instant
+# populate_or_lazy, populate_or_read: memory map and read the whole model on load (default)
+# read, parallel_read: read the model into private memory of each process
+load_methods = {
+    'lazy': kenlm.LoadMethod.LAZY,
+    'populate_or_lazy': kenlm.LoadMethod.POPULATE_OR_LAZY,
+    'populate_or_read': kenlm.LoadMethod.POPULATE_OR_READ,
+    'read': kenlm.LoadMethod.READ,
+    'parallel_read': kenlm.LoadMethod.PARALLEL_READ,
+}
+
+# First bytes of KenLM binary models, ARPA files are always parsed into private memory
+kenlm_binary_magic = b'mmap lm http://kheafield.com/code'
+
 class LMFluencyFilter:
     
     def __init__(self, lm_type:LMType , language:str, tokenizer_command):
@@ -90,9 +105,15 @@ class LMFluencyFilter:
         output = subprocess.run("build_binary "+lm_file+".arpa "+ lm_file, shell=True, stderr=PIPE, stdout=PIPE)
         cls.__print_output(output)
     
-    def load_lm(self, lm_path:str):
+    def load_lm(self, lm_path:str, load_method:str=None):
         self.lm_path=lm_path
-        self.lm=kenlm.LanguageModel(self.lm_path)
+        config = kenlm.Config()
+        if load_method is not None:
+            with open(self.lm_path, 'rb') as lm_file:
+                if lm_file.read(len(kenlm_binary_magic)) != kenlm_binary_magic:
+                    logging.warning(f"Load method '{load_method}' only applies to binary models, {self.lm_path} will be fully loaded")
+            config.load_method = load_methods[load_method]
+        self.lm=kenlm.LanguageModel(self.lm_path, config)
     
 #    def _sentence_split(self,sentence:str):
 #        return self.splitter([sentence])
@@ -105,6 +126,14 @@ class LMFluencyFilter:
         else:
             tokline=" ".join([ "SPACE" if c == " " else c for c in sentence  ])
         return tokline
+
+    def _tokenize_batch(self, sentences):
+        sentences = [self.normalizer.normalize(sentence) for sentence in sentences]
+
+        if self.type != LMType.CHARACTER:
+            return [" ".join(tokens) for tokens in self.tokenizer.tokenize(sentences)]
+        else:
+            return [" ".join([ "SPACE" if c == " " else c for c in sentence ]) for sentence in sentences]
     
     def _introduce_placeholders(self, sentence):
         if self.type != LMType.PLACEHOLDER:
@@ -196,6 +225,14 @@ class LMFluencyFilter:
         #Normalize score
         #return sum(raw_scores)/(sum([len(s.split()) for s in processed_sents]) + len(processed_sents) ) # We divide by total number of tokens + 1 for each sentence (taken from kenlm perplexity method)
         return  raw_score/(sum([len(processed_sent.split())]) +1) #the same, but assuming only 1 sentence
+
+    def score_batch(self, sentences):
+        ''' Scores of a list of sentences, tokenized all at once '''
+        scores = []
+        for tokline in self._tokenize_batch(sentences):
+            processed_sent = self._introduce_placeholders(tokline)
+            scores.append(self._raw_score(processed_sent)/(len(processed_sent.split()) + 1))
+        return scores
         
 class DualLMStats:
     def __init__(self,clean_mean:float, clean_stddev:float, noisy_mean:float, noisy_stddev: float):
@@ -226,9 +263,9 @@ class DualLMFluencyFilter:
         self.tl_filter=LMFluencyFilter(lm_type,tl, tl_tokenizer)
         self.scoring_stats=None
     
-    def load(self,sl_lm_path:str,tl_lm_path:str,stats: DualLMStats):
-        self.sl_filter.load_lm(sl_lm_path)
-        self.tl_filter.load_lm(tl_lm_path)
+    def load(self,sl_lm_path:str,tl_lm_path:str,stats: DualLMStats, load_method:str=None):
+        self.sl_filter.load_lm(sl_lm_path, load_method)
+        self.tl_filter.load_lm(tl_lm_path, load_method)
         self.scoring_stats=stats
     
     def score(self, sentence_sl: str, sentence_tl: str):
@@ -255,8 +292,13 @@ class DualLMFluencyFilter:
             self.tl_filter.cleanup()
         return stats
 
-def load_lm_filter(source_lang, target_lang, metadata_yaml, source_tokenizer_command, target_tokenizer_command):
+def load_lm_filter(source_lang, target_lang, metadata_yaml, source_tokenizer_command, target_tokenizer_command, load_method=None):
     logging.debug("Loading LM filter")
+    # Command line load method has precedence over the metadata one
+    if load_method is None:
+        load_method = metadata_yaml.get('lm_load_method')
+    if load_method is not None and load_method not in load_methods:
+        raise ValueError(f"Unknown LM load method '{load_method}', valid ones are: {', '.join(load_methods)}")
 
     lmFilter = DualLMFluencyFilter( LMType[metadata_yaml['lm_type']], source_lang, target_lang, source_tokenizer_command, target_tokenizer_command)
     stats=DualLMStats(metadata_yaml['clean_mean_perp'], metadata_yaml['clean_stddev_perp'], metadata_yaml['noisy_mean_perp'], metadata_yaml['noisy_stddev_perp'] )
@@ -273,7 +315,7 @@ def load_lm_filter(source_lang, target_lang, metadata_yaml, source_tokenizer_com
     else:
         target_lm = metadata_yaml['target_lm']
 
-    lmFilter.load(source_lm, target_lm, stats)
+    lmFilter.load(source_lm, target_lm, stats, load_method)
 
     return lmFilter
 
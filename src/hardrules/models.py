@@ -0,0 +1,90 @@
+import importlib.util
+import json
+import logging
+import os
+
+try:
+    from .util import cache_dir, write_cache_file
+    from .hardrules import Hardrules
+except (SystemError, ImportError):
+    from util import cache_dir, write_cache_file
+    from hardrules import Hardrules
+
+
+def load_porn_removal(metadata_yaml):
+    ''' Porn removal classifier of the metadata, relative to the metadata directory or as is '''
+    import fasttext
+    # Remove fasttext warning
+    fasttext.FastText.eprint = lambda x: None
+    try:
+        return fasttext.load_model(os.path.join(metadata_yaml["yamldir"], metadata_yaml['porn_removal_file']))
+    except:
+        return fasttext.load_model(metadata_yaml['porn_removal_file'])
+
+
+def effective_config(args):
+    config = dict(Hardrules.rule_pipeline)
+    if args.rules_config:
+        config.update(args.rules_config)
+    return config
+
+
+def preflight(args):
+    '''
+    Make sure the models of the enabled rules are available before starting the workers,
+    without loading them in the main process
+    '''
+    config = effective_config(args)
+
+    if not args.disable_lang_ident and config['no_wrong_language']:
+        # FastSpell downloads the fasttext langid model next to its code when missing,
+        # workers would download it at the same time
+        fastspell = importlib.util.find_spec('fastspell')
+        if fastspell is None or not os.path.exists(os.path.join(fastspell.submodule_search_locations[0], 'lid.176.bin')):
+            from fastspell import FastSpell
+            FastSpell("en", mode="aggr")
+
+
+def is_current_snapshot(snapshot):
+    ''' Check that a HF snapshot directory is the one the main revision points to '''
+    refs = os.path.join(os.path.dirname(os.path.dirname(snapshot)), 'refs', 'main')
+    try:
+        with open(refs) as f:
+            return f.read().strip() == os.path.basename(snapshot)
+    except OSError:
+        return False
+
+
+def real_metadata_path(path):
+    if path is None or os.path.exists(path):
+        # local path, we just use it, return abs path
+        return path
+    elif not path.startswith('bitextor/bicleaner-ai'):
+        # In case does not exist, check if it follows the pattern of HF bicleaner-ai models
+        # If not, just raise the error
+        raise FileNotFoundError(f"No such file or directory: {path}'.")
+
+    # Snapshots resolved in previous runs, importing huggingface_hub takes a while
+    cache_name = 'snapshots.json'
+    try:
+        with open(os.path.join(cache_dir(), cache_name)) as f:
+            snapshots = json.load(f)
+    except (OSError, ValueError):
+        snapshots = {}
+    if path in snapshots and is_current_snapshot(snapshots[path]):
+        return f"{snapshots[path]}/metadata.yaml"
+
+    from huggingface_hub import snapshot_download
+    try:
+        new_path = snapshot_download(path, local_files_only=True)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Could not find '{path}' in local HF cache, " \
+            "please download it with 'bicleaner-ai-download' before running hardrules")
+
+    snapshots[path] = new_path
+    try:
+        write_cache_file(cache_name, json.dumps(snapshots))
+    except OSError as e:
+        logging.debug(f"Could not cache snapshot path: {e}")
+
+    return f"{new_path}/metadata.yaml"
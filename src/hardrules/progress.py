@@ -0,0 +1,106 @@
+import logging
+
+from multiprocessing import Array, Value
+from threading import Event, Thread
+from timeit import default_timer
+
+try:
+    from .util import write_atomic, process_rss
+except (SystemError, ImportError):
+    from util import write_atomic, process_rss
+
+
+class Progress:
+    '''
+    Progress counters shared by the mapper, the workers and the reducer.
+    Each counter is only updated by one process, so they don't need locks.
+    '''
+
+    def __init__(self, workers):
+        self.blocks_mapped = Value('Q', 0, lock=False)
+        self.bytes_mapped = Value('Q', 0, lock=False)
+        self.blocks_finished = Array('Q', workers, lock=False)
+        self.rows_finished = Array('Q', workers, lock=False)
+        self.reorder_heap = Value('Q', 0, lock=False)
+
+
+class ProgressWriter(Thread):
+    '''
+    Thread of the main process that writes the progress counters, queue sizes
+    and memory of the workers to a file in Prometheus text format every interval seconds.
+    The file is replaced atomically, it can be read with the textfile collector of node_exporter.
+    '''
+
+    def __init__(self, progress, path, interval, queues, workers, input_bytes=None):
+        super().__init__(daemon=True)
+        self.progress = progress
+        self.path = path
+        self.interval = interval
+        self.queues = queues
+        self.workers = workers
+        self.input_bytes = input_bytes
+        self.start_time = default_timer()
+        self.last_time = self.start_time
+        self.last_rows = [0] * len(workers)
+        self.stopped = Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.write()
+
+    def stop(self):
+        ''' Stop the thread and write the final values '''
+        self.stopped.set()
+        self.join()
+        self.write()
+
+    def write(self):
+        try:
+            write_atomic(self.path, self.metrics())
+        except OSError as e:
+            logging.warning(f"Could not write progress metrics to {self.path}: {e}")
+
+    def metrics(self):
+        progress = self.progress
+        now = default_timer()
+        rows = list(progress.rows_finished)
+        elapsed = max(now - self.last_time, 1e-9)
+        rates = [(rows[i] - self.last_rows[i]) / elapsed for i in range(len(rows))]
+        self.last_time, self.last_rows = now, rows
+
+        lines = []
+        def metric(name, kind, description, samples):
+            lines.append(f"# HELP hardrules_{name} {description}")
+            lines.append(f"# TYPE hardrules_{name} {kind}")
+            for labels, value in samples:
+                lines.append(f"hardrules_{name}{labels} {value}")
+
+        def per_worker(values):
+            return [(f'{{worker="{i}"}}', value) for i, value in enumerate(values)]
+
+        metric("elapsed_seconds", "gauge", "Time since the workers started", [("", f"{now - self.start_time:.3f}")])
+        metric("blocks_mapped_total", "counter", "Blocks handed to the workers", [("", progress.blocks_mapped.value)])
+        metric("bytes_mapped_total", "counter", "Input bytes handed to the workers", [("", progress.bytes_mapped.value)])
+        if self.input_bytes is not None:
+            metric("input_bytes", "gauge", "Size of the input file", [("", self.input_bytes)])
+        metric("rows_finished_total", "counter", "Rows classified by each worker", per_worker(rows))
+        metric("blocks_finished_total", "counter", "Blocks classified by each worker", per_worker(progress.blocks_finished))
+        metric("rows_per_second", "gauge", "Rows classified by each worker per second since the previous update",
+               per_worker(f"{rate:.1f}" for rate in rates))
+
+        sizes = []
+        for name, queue in self.queues.items():
+            try:
+                sizes.append((f'{{queue="{name}"}}', queue.qsize()))
+            except NotImplementedError:
+                # Not available on macOS
+                pass
+        if sizes:
+            metric("queue_size", "gauge", "Blocks waiting in each queue", sizes)
+        metric("reorder_heap_size", "gauge", "Finished blocks waiting to be written in order", [("", progress.reorder_heap.value)])
+
+        rss = [(i, process_rss(worker.pid)) for i, worker in enumerate(self.workers)]
+        rss = [(f'{{worker="{i}"}}', value) for i, value in rss if value is not None]
+        if rss:
+            metric("worker_resident_bytes", "gauge", "Resident memory of each worker", rss)
+        return "\n".join(lines) + "\n"
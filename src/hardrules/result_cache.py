@@ -0,0 +1,89 @@
+from collections import OrderedDict
+
+# Approximate memory used by each cached result: dict entry, hash key and value
+entry_size = 200
+
+# Marks results that are not cached, None can be a result
+missing = object()
+
+class ResultCache:
+    '''
+    Bounded LRU cache of the results of model-backed rules, one per worker.
+    Results are keyed by a hash of the rule name, side and sentence,
+    repeated sentences of crawled corpora are scored only once.
+    '''
+
+    def __init__(self, size_mb):
+        self.max_entries = int(size_mb * 1024 * 1024) // entry_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, key):
+        value = self.entries.get(key, missing)
+        if value is missing:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return value
+
+    def store(self, key, value):
+        self.entries[key] = value
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def wrap(self, name, function):
+        ''' Cached version of a function of one sentence '''
+        if self.max_entries <= 0:
+            return function
+        lookup = self.lookup
+        store = self.store
+
+        def cached(sentence):
+            key = hash((name, sentence))
+            value = lookup(key)
+            if value is missing:
+                value = function(sentence)
+                store(key, value)
+            return value
+        return cached
+
+    def wrap_batch(self, name, function):
+        '''
+        Cached version of a function of a list of sentences,
+        only the sentences not cached are passed to it, once each.
+        '''
+        if self.max_entries <= 0:
+            return function
+        lookup = self.lookup
+        store = self.store
+
+        def cached(sentences):
+            keys = [hash((name, sentence)) for sentence in sentences]
+            results = [lookup(key) for key in keys]
+            pending = {}
+            for i, value in enumerate(results):
+                if value is missing:
+                    pending.setdefault(keys[i], []).append(i)
+            if pending:
+                # Repeated sentences of the batch are computed once, count them as hits
+                repeated = sum(map(len, pending.values())) - len(pending)
+                self.hits += repeated
+                self.misses -= repeated
+                first = [positions[0] for positions in pending.values()]
+                computed = function([sentences[i] for i in first])
+                for positions, value in zip(pending.values(), computed):
+                    store(keys[positions[0]], value)
+                    for i in positions:
+                        results[i] = value
+            return results
+        return cached
+
+    def stats(self):
+        total = self.hits + self.misses
+        hit_rate = self.hits / total if total else 0.0
+        return f"{len(self.entries)} entries, {self.hits} hits, {self.misses} misses, hit rate {hit_rate:.1%}"
@@ -0,0 +1,116 @@
+import logging
+import math
+
+# Percentiles of the time per pair in the report
+percentiles = (50, 90, 99)
+
+def percentile(values, p):
+    ''' Nearest-rank percentile of a sorted list '''
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+class RuleStats:
+    '''
+    Statistics of the rules applied by a worker: calls, rejected pairs and,
+    when timing, the time spent in each step of the pipeline.
+    A call is a rule applied to the pairs of a block still in the pipeline.
+    Pairs answered from the verdict store count as cached, in the totals and rejections but not in the calls.
+    Rules applied to sample the adaptive order or to find the exact reasons are counted apart,
+    as extra calls and time, so calls and time per pair are those of the pipeline.
+    Workers send them as dicts and the reducer merges them in a report.
+    '''
+
+    def __init__(self, labels, timing=False):
+        self.labels = labels
+        self.timing = timing
+        self.pairs = 0
+        self.kept = 0
+        self.cached = 0
+        self.prechecks = {}
+        self.calls = [0] * len(labels)
+        self.rejected = [0] * len(labels)
+        self.time = [0.0] * len(labels)
+        self.extra_calls = [0] * len(labels)
+        self.extra_time = [0.0] * len(labels)
+        # Time per pair of each call
+        self.pair_times = [[] for _ in labels]
+
+    def add_time(self, n, pairs, elapsed):
+        self.time[n] += elapsed
+        if pairs:
+            self.pair_times[n].append(elapsed / pairs)
+
+    def add_verdicts(self, verdicts, reasons, cached=False):
+        ''' Count the verdicts and reason codes of a block '''
+        self.pairs += len(verdicts)
+        self.kept += sum(verdicts)
+        if cached:
+            self.cached += len(verdicts)
+        for code in reasons:
+            while code:
+                n = code.bit_length() - 1
+                self.rejected[n] += 1
+                code ^= 1 << n
+
+    def add_precheck(self, name):
+        self.prechecks[name] = self.prechecks.get(name, 0) + 1
+        self.pairs += 1
+
+    def to_dict(self):
+        return {
+            "labels": self.labels, "timing": self.timing,
+            "pairs": self.pairs, "kept": self.kept, "cached": self.cached, "prechecks": self.prechecks,
+            "calls": self.calls, "rejected": self.rejected,
+            "time": self.time, "pair_times": self.pair_times,
+            "extra_calls": self.extra_calls, "extra_time": self.extra_time,
+        }
+
+    @classmethod
+    def from_dicts(cls, dicts):
+        ''' Merge the stats of all the workers '''
+        stats = None
+        for data in dicts:
+            if stats is None:
+                stats = cls(data["labels"], data["timing"])
+            stats.pairs += data["pairs"]
+            stats.kept += data["kept"]
+            stats.cached += data["cached"]
+            for name, count in data["prechecks"].items():
+                stats.prechecks[name] = stats.prechecks.get(name, 0) + count
+            for n in range(len(stats.labels)):
+                stats.calls[n] += data["calls"][n]
+                stats.rejected[n] += data["rejected"][n]
+                stats.time[n] += data["time"][n]
+                stats.pair_times[n].extend(data["pair_times"][n])
+                stats.extra_calls[n] += data["extra_calls"][n]
+                stats.extra_time[n] += data["extra_time"][n]
+        return stats
+
+    def report(self):
+        rules = []
+        for n, label in enumerate(self.labels):
+            rule, _, side = label.rstrip(")").partition("(")
+            entry = {
+                "rule": rule, "side": side, "label": label,
+                "calls": self.calls[n], "rejected": self.rejected[n],
+                "extra_calls": self.extra_calls[n],
+            }
+            if self.timing:
+                entry["time"] = self.time[n]
+                entry["extra_time"] = self.extra_time[n]
+                pair_times = sorted(self.pair_times[n])
+                if pair_times:
+                    entry["time_per_pair"] = {"mean": sum(pair_times) / len(pair_times)}
+                    for p in percentiles:
+                        entry["time_per_pair"][f"p{p}"] = percentile(pair_times, p)
+            rules.append(entry)
+        return {"pairs": self.pairs, "kept": self.kept, "cached": self.cached, "prechecks": self.prechecks, "rules": rules}
+
+    def log_summary(self):
+        total = sum(self.time)
+        logging.info(f"Rule profile: {self.pairs} pairs, {self.kept} kept, {self.cached} cached, {total:.2f} s in rules")
+        if any(self.extra_calls):
+            logging.info(f"  {sum(self.extra_time):.2f} s in {sum(self.extra_calls)} extra calls to sample the order and find the reasons")
+        for n in sorted(range(len(self.labels)), key=lambda n: -self.time[n]):
+            share = self.time[n] / total if total else 0.0
+            logging.info(f"  {self.labels[n]}: {self.time[n]:.3f} s ({share:.1%}), {self.calls[n]} pairs checked, {self.rejected[n]} rejected")
@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+'''
+Synthetic English-German bitext to measure throughput and memory at any scale without real corpora.
+Clean pairs are random sentences from small vocabularies, noisy pairs have one kind of the noise
+the rules look for. The output is deterministic given the seed and the chunk size:
+each chunk of pairs is generated with its own random generator, so chunks can be
+generated in parallel and written in order.
+'''
+import argparse
+import logging
+import os
+import random
+import sys
+
+from multiprocessing import Pool
+from timeit import default_timer
+
+try:
+    from .compression import get_compression, compress_block, import_zstandard
+    from .util import logging_setup, check_positive, check_positive_between_zero_and_one
+except (SystemError, ImportError):
+    from compression import get_compression, compress_block, import_zstandard
+    from util import logging_setup, check_positive, check_positive_between_zero_and_one
+
+source_lang = "en"
+target_lang = "de"
+
+vocabularies = {
+    "en": ("the house of a good day is very new and old people work with small city on time for every year "
+           "we can see this water under light where children play music before long night after school "
+           "market river garden friend table window morning village letter summer doctor kitchen").split(),
+    "de": ("das haus ist ein guter tag sehr neu und alte leute arbeiten mit kleiner stadt auf zeit für jedes jahr "
+           "wir können dieses wasser unter licht sehen wo kinder musik spielen vor langer nacht nach schule "
+           "markt fluss garten freund tisch fenster morgen dorf brief sommer arzt küche größe schön").split(),
+    # Sentences in a language that is neither source nor target
+    "fr": ("la maison est un bon jour très nouveau et les vieux gens travaillent avec petite ville sur temps "
+           "pour chaque année nous pouvons voir cette eau sous lumière où enfants jouent musique avant").split(),
+}
+
+# Mojibake of UTF-8 text decoded as Windows-1252
+mojibake = {"ü": "Ã¼", "ö": "Ã¶", "ä": "Ã¤", "ß": "ÃŸ", "é": "Ã©", "à": "Ã "}
+
+# Longer than the default not_too_long
+long_length = 1100
+
+def sentence(rng, lang, length):
+    vocabulary = vocabularies[lang]
+    words = []
+    while len(words) < length:
+        for word in rng.choices(vocabulary, k=length - len(words)):
+            # Repeating a recent word could make a repeated phrase
+            if word not in words[-3:]:
+                words.append(word)
+    text = " ".join(words)
+    return text[0].upper() + text[1:] + "."
+
+def clean_pair(rng):
+    length = rng.randint(4, 30)
+    left = sentence(rng, source_lang, length)
+    right = sentence(rng, target_lang, max(3, length + rng.randint(-3, 3)))
+    if rng.random() < 0.1:
+        # Same number on both sides
+        number = str(rng.randint(2, 2030))
+        left = f"{number} {left[0].lower()}{left[1:]}"
+        right = f"{number} {right[0].lower()}{right[1:]}"
+    return left, right
+
+def words_of(text):
+    return text.rstrip(".").split()
+
+def add_breadcrumbs(rng, left, right):
+    # The rule needs both kinds of separators
+    def path(lang):
+        words = rng.sample(vocabularies[lang], rng.randint(6, 8))
+        return " > ".join(words[:4]).capitalize() + " | " + " | ".join(words[4:])
+    return path(source_lang), path(target_lang)
+
+def add_glued_words(rng, left, right):
+    words = words_of(left)
+    position = rng.randrange(len(words))
+    glued = "".join([word.capitalize() for word in rng.sample(vocabularies[source_lang], 3)])
+    return " ".join(words[:position] + [glued] + words[position:]) + ".", right
+
+def add_repeated_words(rng, left, right):
+    words = words_of(left)
+    phrase = " ".join(words[:3]) if len(words) >= 3 else "the old house"
+    return f"{phrase} {phrase} {left}", right
+
+def add_escaped_unicode(rng, left, right):
+    words = words_of(right)
+    position = rng.randrange(len(words))
+    words[position] = rng.choice(("\\u00fc", "\\xc3\\xb6", "\\u2019")) + words[position]
+    return left, " ".join(words) + "."
+
+def add_bad_encoding(rng, left, right):
+    broken = "".join([mojibake.get(c, c) for c in right])
+    if broken == right:
+        broken = right + " Â©"
+    return left, broken
+
+def add_paren(rng, left, right):
+    words = words_of(left)
+    position = rng.randrange(len(words))
+    words[position] = rng.choice("[{⟨") + words[position]
+    return " ".join(words) + ".", right
+
+def add_urls(rng, left, right):
+    url = f"https://www.example{rng.randrange(100)}.com/{rng.choice(vocabularies[source_lang])}"
+    if rng.random() < 0.5:
+        return f"{left} {url}", right
+    return f"{left} {url}", f"{right} {url}"
+
+def add_titles(rng, left, right):
+    return left.title(), right.title()
+
+def add_wrong_language(rng, left, right):
+    wrong = sentence(rng, "fr", len(words_of(left)))
+    if rng.random() < 0.5:
+        return wrong, right
+    return left, wrong
+
+def add_too_long(rng, left, right):
+    words = []
+    length = 0
+    while length <= long_length:
+        word = rng.choice(vocabularies[source_lang])
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words) + ".", right
+
+def add_too_short(rng, left, right):
+    return left, rng.choice(vocabularies[target_lang]).capitalize()
+
+# Kinds of noise and the rule that should discard them
+noise_kinds = {
+    "breadcrumbs": (add_breadcrumbs, "no_breadcrumbs"),
+    "glued_words": (add_glued_words, "no_glued_words"),
+    "repeated_words": (add_repeated_words, "no_repeated_words"),
+    "escaped_unicode": (add_escaped_unicode, "no_escaped_unicode"),
+    "bad_encoding": (add_bad_encoding, "no_bad_encoding"),
+    "paren": (add_paren, "no_paren"),
+    "urls": (add_urls, "no_urls"),
+    "titles": (add_titles, "no_titles"),
+    "wrong_language": (add_wrong_language, "no_wrong_language"),
+    "too_long": (add_too_long, "not_too_long"),
+    "too_short": (add_too_short, "not_too_short"),
+}
+
+default_mixture = {"clean": 0.78, **{kind: 0.02 for kind in noise_kinds}}
+
+def parse_mixture(value):
+    '''
+    Weights of clean pairs and each kind of noise as 'kind=weight,...',
+    kinds not given get no pairs. Weights are normalized.
+    '''
+    mixture = {}
+    for item in value.split(","):
+        kind, _, weight = item.partition("=")
+        kind = kind.strip()
+        if kind != "clean" and kind not in noise_kinds:
+            raise argparse.ArgumentTypeError(f"unknown kind of noise '{kind}', choose from clean, {', '.join(noise_kinds)}")
+        try:
+            mixture[kind] = float(weight)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"weight of '{kind}' must be a number")
+        if mixture[kind] < 0:
+            raise argparse.ArgumentTypeError(f"weight of '{kind}' must be positive")
+    if sum(mixture.values()) <= 0:
+        raise argparse.ArgumentTypeError("at least one weight must be greater than 0")
+    return mixture
+
+def generate_chunk(seed, index, size, mixture=None, duplicate_rate=0.0):
+    ''' Sentence pairs of chunk number index, as a list of (source, target, kind) '''
+    mixture = default_mixture if mixture is None else mixture
+    rng = random.Random(f"{seed}:{index}")
+    kinds = list(mixture)
+    weights = [mixture[kind] for kind in kinds]
+    pairs = []
+    for _ in range(size):
+        if pairs and rng.random() < duplicate_rate:
+            pairs.append(pairs[rng.randrange(len(pairs))])
+            continue
+        kind = rng.choices(kinds, weights)[0]
+        left, right = clean_pair(rng)
+        if kind != "clean":
+            left, right = noise_kinds[kind][0](rng, left, right)
+        pairs.append((left, right, kind))
+    return pairs
+
+def generate_pairs(count, seed=1, mixture=None, duplicate_rate=0.0, chunk_size=10000):
+    ''' Iterate over count (source, target, kind) pairs '''
+    for index, start in enumerate(range(0, count, chunk_size)):
+        yield from generate_chunk(seed, index, min(chunk_size, count - start), mixture, duplicate_rate)
+
+def encode_chunk(task):
+    seed, index, size, mixture, duplicate_rate, with_kind, compression = task
+    pairs = generate_chunk(seed, index, size, mixture, duplicate_rate)
+    if with_kind:
+        lines = [f"{left}\t{right}\t{kind}\n" for left, right, kind in pairs]
+    else:
+        lines = [f"{left}\t{right}\n" for left, right, _ in pairs]
+    return compress_block("".join(lines).encode("utf-8"), compression)
+
+def write_bitext(output, count, seed=1, mixture=None, duplicate_rate=0.0, chunk_size=10000,
+                 processes=1, with_kind=False, compression=None):
+    '''
+    Write count pairs as 'source<TAB>target' lines to a binary file, plus the kind of noise if with_kind.
+    Chunks are generated and compressed by a pool of processes and written in order,
+    so the output is the same with any number of processes.
+    '''
+    tasks = ((seed, index, min(chunk_size, count - start), mixture, duplicate_rate, with_kind, compression)
+             for index, start in enumerate(range(0, count, chunk_size)))
+    if processes == 1:
+        for data in map(encode_chunk, tasks):
+            output.write(data)
+        return
+    with Pool(processes) as pool:
+        for data in pool.imap(encode_chunk, tasks):
+            output.write(data)
+
+def initialization():
+    parser = argparse.ArgumentParser(prog=os.path.basename(sys.argv[0]), formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+                                     description="Generate synthetic noisy English-German bitext to benchmark bicleaner-hardrules")
+    parser.add_argument('output', nargs='?', default='-', help="Output file, '-' for standard output. Files ending in .gz or .zst are compressed")
+
+    groupO = parser.add_argument_group("Optional")
+    groupO.add_argument('-n', '--pairs', type=check_positive, default=100000, help="Number of sentence pairs")
+    groupO.add_argument('--seed', type=int, default=1, help="Random seed, the same seed and chunk size give the same output")
+    groupO.add_argument('--mixture', type=parse_mixture, default=default_mixture,
+                        help=f"Weights of clean pairs and each kind of noise as 'kind=weight,...', kinds: {', '.join(noise_kinds)}")
+    groupO.add_argument('--duplicate_rate', type=check_positive_between_zero_and_one, default=0.0,
+                        help="Fraction of pairs that repeat a previous pair of the same chunk")
+    groupO.add_argument('--chunk_size', type=check_positive, default=10000, help="Pairs generated at a time by each process")
+    groupO.add_argument('-p', '--processes', type=check_positive, default=max(1, os.cpu_count() - 1), help="Number of processes")
+    groupO.add_argument('--with_kind', action='store_true', help="Add a third column with the kind of noise of each pair")
+
+    groupL = parser.add_argument_group('Logging')
+    groupL.add_argument('-q', '--quiet', action='store_true', help='Silent logging mode')
+    groupL.add_argument('--debug', action='store_true', help='Debug logging mode')
+    groupL.add_argument('--logfile', type=argparse.FileType('a'), default=sys.stderr, help="Store log to a file")
+
+    args = parser.parse_args()
+    logging_setup(args)
+    args.compression = get_compression(args.output)
+    if args.compression == 'zstd':
+        import_zstandard()
+    return args
+
+def main():
+    args = initialization()
+    start = default_timer()
+    output = sys.stdout.buffer if args.output == '-' else open(args.output, 'wb')
+    try:
+        write_bitext(output, args.pairs, args.seed, args.mixture, args.duplicate_rate, args.chunk_size,
+                     args.processes, args.with_kind, args.compression)
+    finally:
+        if output is not sys.stdout.buffer:
+            output.close()
+    elapsed = default_timer() - start
+    logging.info(f"{args.pairs} pairs written in {elapsed:.2f} s ({args.pairs / elapsed:.0f} pairs/s)")
+
+if __name__ == '__main__':
+    main()
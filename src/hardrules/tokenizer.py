@@ -1,6 +1,7 @@
 from sacremoses import MosesTokenizer
 from toolwrapper import ToolWrapper
 from subprocess import run, PIPE
+from threading import Thread
 import logging
 import sys
 import os
@@ -27,10 +28,12 @@ class Tokenizer:
     def tokenize(self, text):
         if self.external:
             if isinstance(text, list):
-                return self.tokenize_block('\n'.join(text) + '\n').split('\n')
+                return [[no_escaping(t) for t in line.split()] for line in self.tokenize_stream(text)]
             else:
                 self.tokenizer.writeline(text.rstrip('\n'))
-                return ([no_escaping(t) for t in self.tokenizer.readline().rstrip('\n').split()])
+                # Read bytes, the text wrapper would also split lines at '\r'
+                line = self.tokenizer.stdout.buffer.readline().decode('utf-8')
+                return ([no_escaping(t) for t in line.rstrip('\n').split()])
         else:
             if isinstance(text, list):
                 return [self.tokenizer.tokenize(line, escape=False) for line in text]
@@ -58,6 +61,40 @@ class Tokenizer:
         if self.external:
             self.tokenizer.restart()
 
+    def tokenize_stream(self, lines):
+        '''
+        Stream a list of sentences through the running tokenizer process.
+        A writer thread feeds the input while the output is read,
+        so many sentences are in flight instead of one round trip per sentence.
+        Returns the output lines in the same order.
+        '''
+        if not lines:
+            return []
+        # Bypass the text wrappers of ToolWrapper like the single sentence path
+        stdin = self.tokenizer.stdin.buffer
+        stdout = self.tokenizer.stdout.buffer
+        errors = []
+
+        def write():
+            try:
+                # A newline inside a sentence would shift all the following output lines
+                stdin.write(''.join(line.rstrip('\n').replace('\n', ' ') + '\n' for line in lines).encode('utf-8'))
+                stdin.flush()
+            except OSError as e:
+                errors.append(e)
+
+        writer = Thread(target=write, daemon=True)
+        writer.start()
+        output = []
+        for _ in range(len(lines)):
+            line = stdout.readline()
+            if not line.endswith(b'\n'):
+                writer.join()
+                raise RuntimeError(f"Tokenizer {self.cmd!r} stopped after {len(output)} of {len(lines)} lines: {errors or 'no output'}")
+            output.append(line[:-1].decode('utf-8'))
+        writer.join()
+        return output
+
     def tokenize_block(self, text):
         logging.debug(f'Opening subprocess: {self.cmd!r}')
         output = run(self.cmd, input=text, stdout=PIPE, stderr=PIPE, env=os.environ, encoding='utf-8')
@@ -0,0 +1,163 @@
+import logging
+import mmap
+import os
+import stat
+
+from multiprocessing import resource_tracker, shared_memory
+from tempfile import NamedTemporaryFile
+
+# Block hand-off between mapper, workers and reducer.
+# Blocks are UTF-8 encoded bytes of whole lines.
+# put() stores a block and returns a small picklable handle to be sent through the queues,
+# get() retrieves the block from a handle and releases its resources,
+# so each block has to be read exactly once.
+
+class FileTransport:
+    ''' Blocks are stored in temporary files in tmp_dir '''
+
+    def __init__(self, tmp_dir):
+        self.tmp_dir = tmp_dir
+
+    def put(self, data):
+        with NamedTemporaryFile(mode="wb", delete=False, dir=self.tmp_dir) as fileout:
+            logging.debug("Creating temporary filename {0}".format(fileout.name))
+            fileout.write(data)
+        return fileout.name
+
+    def get(self, handle):
+        with open(handle, 'rb') as filein:
+            data = filein.read()
+        os.unlink(handle)
+        return data
+
+
+class SharedMemoryTransport:
+    ''' Blocks are stored in shared memory segments '''
+
+    def __init__(self):
+        # Segments are created and unlinked by different processes,
+        # all of them need to report to the same resource tracker
+        resource_tracker.ensure_running()
+
+    def put(self, data):
+        # Zero sized segments are not allowed
+        shm = shared_memory.SharedMemory(create=True, size=max(1, len(data)))
+        shm.buf[:len(data)] = data
+        logging.debug("Creating shared memory segment {0} ({1} bytes)".format(shm.name, len(data)))
+        shm.close()
+        return shm.name, len(data)
+
+    def get(self, handle):
+        name, size = handle
+        shm = shared_memory.SharedMemory(name=name)
+        data = bytes(shm.buf[:size])
+        shm.close()
+        shm.unlink()
+        return data
+
+
+class MappedInput:
+    '''
+    Input file mapped in memory, read-only and shared by all the processes.
+    Blocks are (start, end) byte ranges of whole lines, so nothing is copied by the mapper.
+    '''
+
+    def __init__(self, fileobj):
+        fd = fileobj.fileno()
+        # Start from the current position, the file may be a partially read stdin
+        self.start = os.lseek(fd, 0, os.SEEK_CUR)
+        self.map = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+
+    def blocks(self, block_size):
+        ''' Split the file in ranges of block_size lines '''
+        start = self.start
+        size = len(self.map)
+        while start < size:
+            end = start
+            nlines = 0
+            while nlines < block_size and end < size:
+                # Last line can be missing the line ending
+                end = self.map.find(b'\n', end) + 1 or size
+                nlines += 1
+            yield start, end
+            start = end
+
+    def put(self, block):
+        return block
+
+    def get(self, handle):
+        start, end = handle
+        return self.map[start:end]
+
+    def block_bytes(self, block):
+        start, end = block
+        return end - start
+
+    def input_bytes(self):
+        return len(self.map) - self.start
+
+
+class SplitInput(MappedInput):
+    '''
+    Input file mapped in memory, split in fixed size byte ranges without reading it.
+    Blocks are range numbers, each worker aligns its range to line boundaries:
+    a block has all the lines that start inside its range.
+    '''
+
+    # Bytes read to estimate the average line length
+    sample_size = 1024 * 1024
+
+    def __init__(self, fileobj, block_size):
+        super().__init__(fileobj)
+        # Range size for approximately block_size lines per block
+        sample = self.map[self.start:self.start + self.sample_size]
+        line_length = len(sample) / max(1, sample.count(b'\n'))
+        self.range_size = max(1, int(line_length * block_size))
+        logging.debug("Splitting input in blocks of {0} bytes".format(self.range_size))
+
+    def blocks(self, block_size):
+        return range((len(self.map) - self.start + self.range_size - 1) // self.range_size)
+
+    def block_bytes(self, block):
+        # Approximate, the range is not aligned to lines
+        return min(self.range_size, len(self.map) - self.start - block * self.range_size)
+
+    def line_start(self, pos):
+        ''' Position of the first line starting at pos or after it '''
+        if pos <= self.start:
+            return self.start
+        if pos >= len(self.map):
+            return len(self.map)
+        return self.map.find(b'\n', pos - 1) + 1 or len(self.map)
+
+    def get(self, handle):
+        start = self.start + handle * self.range_size
+        return self.map[self.line_start(start):self.line_start(start + self.range_size)]
+
+
+def get_transport(args):
+    if args.transport == 'shm':
+        return SharedMemoryTransport()
+    return FileTransport(args.tmp_dir)
+
+def get_mapped_input(args):
+    ''' Map the input in memory if requested and it is a non empty regular file, None otherwise '''
+    if args.input_mode not in ('mmap', 'split'):
+        return None
+    try:
+        st = os.fstat(args.input.fileno())
+    except (AttributeError, OSError):
+        st = None
+    if st is None or not stat.S_ISREG(st.st_mode) or st.st_size == 0:
+        logging.warning("Input is not a regular file, cannot be mapped in memory. Reading it as text.")
+        return None
+    if args.input_mode == 'split':
+        return SplitInput(args.input, args.block_size)
+    return MappedInput(args.input)
+
+def split_lines(data):
+    ''' Split a block in lines, like iterating over a file, without the line endings '''
+    lines = data.split(b'\n')
+    if lines[-1] == b'':
+        lines.pop()
+    return lines
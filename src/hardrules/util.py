@@ -9,8 +9,11 @@ import sys
 from os import path
 import typing
 import random
+import resource
 
-from tempfile import TemporaryFile
+from queue import Queue
+from tempfile import TemporaryFile, NamedTemporaryFile
+from threading import Thread
 from toolwrapper import ToolWrapper
 
 # variables used by the no_escaping function
@@ -61,6 +64,49 @@ def check_if_folder(path):
         raise argparse.ArgumentTypeError("%s is not a directory" % path)
     return path
 
+# Directory for files cached between runs
+def cache_dir():
+    return os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')), 'bicleaner-hardrules')
+
+# Write a file through a temporary file because other processes may be reading it
+def write_atomic(file_path: str, content: str):
+    with NamedTemporaryFile('w', dir=path.dirname(path.abspath(file_path)), delete=False) as tmp:
+        tmp.write(content)
+    os.replace(tmp.name, file_path)
+
+# Write a file in the cache directory
+def write_cache_file(name: str, content: str):
+    os.makedirs(cache_dir(), exist_ok=True)
+    write_atomic(os.path.join(cache_dir(), name), content)
+
+# Memory used by the current process, as a readable string.
+# PSS splits the pages shared with other processes among them,
+# so it shows the memory saved by sharing models with the workers
+def memory_usage():
+    usage = {}
+    try:
+        with open('/proc/self/smaps_rollup') as smaps:
+            for line in smaps:
+                key, value = line.split(':', 1)
+                if key in ('Rss', 'Pss', 'Shared_Clean', 'Shared_Dirty'):
+                    usage[key] = int(value.split()[0]) // 1024
+    except OSError:
+        # Not Linux, only peak resident memory is available, in bytes on macOS and KB elsewhere
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == 'darwin':
+            max_rss //= 1024
+        return "max RSS {0} MB".format(max_rss // 1024)
+    return "RSS {0} MB, PSS {1} MB, shared {2} MB".format(
+            usage['Rss'], usage['Pss'], usage['Shared_Clean'] + usage['Shared_Dirty'])
+
+# Resident memory of another process in bytes, None if it is not available (not Linux or process finished)
+def process_rss(pid: int):
+    try:
+        with open(f'/proc/{pid}/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
 # Logging config
 def logging_setup(args = None):
     logger = logging.getLogger()
@@ -101,3 +147,37 @@ def shuffle_file(input: typing.TextIO, output: typing.TextIO):
         for offset in offsets:
             temp.seek(offset)
             output.write(temp.readline())
+
+# Read lines from a file in blocks of block_size lines
+def read_blocks(input: typing.TextIO, block_size: int):
+    block = []
+    for line in input:
+        block.append(line)
+        if len(block) == block_size:
+            yield block
+            block = []
+    if block:
+        yield block
+
+# Iterate in a background thread, keeping up to size items ready in advance
+def prefetch(iterable: typing.Iterable, size: int = 1):
+    queue = Queue(maxsize=size)
+    end = object()
+
+    def producer():
+        try:
+            for item in iterable:
+                queue.put((item, None))
+        except Exception as e:
+            queue.put((None, e))
+        finally:
+            queue.put((end, None))
+
+    Thread(target=producer, daemon=True).start()
+    while True:
+        item, error = queue.get()
+        if error is not None:
+            raise error
+        if item is end:
+            break
+        yield item
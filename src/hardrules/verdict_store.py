@@ -0,0 +1,110 @@
+import logging
+import sqlite3
+
+from array import array
+from hashlib import blake2b
+
+# Keys looked up per query, below the SQLite limit of query parameters
+lookup_size = 500
+
+def pair_key(left, right):
+    # Columns can't contain tabs, so the pair is not ambiguous
+    return blake2b(f"{left}\t{right}".encode("utf-8", errors="surrogatepass"), digest_size=16).digest()
+
+
+class VerdictStore:
+    '''
+    On-disk store of the verdicts of previous runs, so re-runs on a growing corpus
+    only evaluate the new sentence pairs.
+    The store keeps the verdicts of one configuration, identified by its fingerprint,
+    verdicts of a different configuration are removed when preparing it.
+    Each worker opens its own connection, SQLite serializes the writes.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path, timeout=600, isolation_level=None)
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.known = 0
+        self.new = 0
+
+    @classmethod
+    def prepare(cls, path, fingerprint):
+        ''' Create the store or clear it if it was made with another fingerprint, before starting the workers '''
+        store = cls(path)
+        db = store.db
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("BEGIN IMMEDIATE")
+        db.execute("CREATE TABLE IF NOT EXISTS info (name TEXT PRIMARY KEY, value TEXT)")
+        db.execute("CREATE TABLE IF NOT EXISTS verdicts (pair BLOB PRIMARY KEY, keep INTEGER, reasons INTEGER) WITHOUT ROWID")
+        row = db.execute("SELECT value FROM info WHERE name = 'fingerprint'").fetchone()
+        if row is None or row[0] != fingerprint:
+            if row is not None:
+                logging.warning(f"Configuration changed since the verdicts in {path} were stored, removing them")
+            db.execute("DELETE FROM verdicts")
+            db.execute("INSERT OR REPLACE INTO info VALUES ('fingerprint', ?)", (fingerprint,))
+        db.execute("COMMIT")
+        logging.info(f"Verdict store {path} has {len(store)} verdicts")
+        store.close()
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
+
+    def lookup(self, keys):
+        ''' Stored verdicts of the given keys, as a dict of key: (keep, reasons) '''
+        found = {}
+        unique = list(set(keys))
+        for start in range(0, len(unique), lookup_size):
+            chunk = unique[start:start + lookup_size]
+            query = f"SELECT pair, keep, reasons FROM verdicts WHERE pair IN ({','.join('?' * len(chunk))})"
+            for key, keep, reasons in self.db.execute(query, chunk):
+                found[key] = (keep, reasons)
+        return found
+
+    def add(self, rows):
+        ''' Store (key, keep, reasons) rows '''
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            self.db.executemany("INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?)", rows)
+        except:
+            self.db.execute("ROLLBACK")
+            raise
+        self.db.execute("COMMIT")
+
+    def wrong_tu_batch(self, hardrules, lefts, rights):
+        '''
+        Same as Hardrules.wrong_tu_batch, but the pairs with a stored verdict are not evaluated
+        and the verdicts of the new ones are stored
+        '''
+        keys = [pair_key(left, right) for left, right in zip(lefts, rights)]
+        found = self.lookup(keys)
+        verdicts = array('B', [1]) * len(keys)
+        reasons = array('Q', [0]) * len(keys)
+        pending = []
+        for i, key in enumerate(keys):
+            if key in found:
+                verdicts[i], reasons[i] = found[key]
+            else:
+                pending.append(i)
+        self.known += len(keys) - len(pending)
+        if hardrules.stats is not None and len(pending) < len(keys):
+            # Only the pending pairs reach the rules, the rest are counted here
+            stored = [i for i, key in enumerate(keys) if key in found]
+            hardrules.stats.add_verdicts([verdicts[i] for i in stored], [reasons[i] for i in stored], cached=True)
+        self.new += len(pending)
+
+        if pending:
+            new_verdicts, new_reasons = hardrules.wrong_tu_batch([lefts[i] for i in pending], [rights[i] for i in pending])
+            rows = {}
+            for i, keep, code in zip(pending, new_verdicts, new_reasons):
+                verdicts[i] = keep
+                reasons[i] = code
+                rows[keys[i]] = (keys[i], keep, code)
+            self.add(rows.values())
+        return verdicts, reasons
+
+    def stats(self):
+        return f"{self.known} known pairs, {self.new} new pairs"
+
+    def close(self):
+        self.db.close()
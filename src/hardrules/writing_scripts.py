@@ -2,6 +2,16 @@
 #with grouping info from https://en.wikipedia.org/wiki/List_of_writing_systems
 
 from unicodedata import *
+import logging
+import os
+import re
+import sys
+import unicodedata
+
+try:
+    from .util import cache_dir, write_cache_file
+except (SystemError, ImportError):
+    from util import cache_dir, write_cache_file
 
 script_data = {
 "names":['Common', 'Latin', 'Greek', 'Cyrillic', 'Armenian', 'Hebrew', 'Arabic',
@@ -580,31 +590,97 @@ def category(chr):
     _, a = script_cat(chr)
     return a
 
+# Scripts grouped in the same family, the rest are a family on their own
+# and characters without script belong to no family ('')
+family_groups = {
+    '': ['Common', 'Inherited', 'Unknown'],
+    'Aramaic': ['Imperial_Aramaic', 'Syriac', 'Mandaic'],
+    'Brahmi': ['Avestan', 'Balinese', 'Batak', 'Bengali', 'Brahmi', 'Buhid', 'Buginese', 'Chakma', 'Cham', 'Devanagari', 'Gujarati', 'Gurmukhi', 'Hanunoo', 'Javanese', 'Kaithi', 'Kannada', 'Kayah_Li', 'Khmer', 'Lao', 'Lepcha', 'Limbu', 'Malayalam', 'Meetei_Mayek', 'Mongolian', 'New_Tai_Lue', 'Oriya', 'Rejang', 'Saurashtra', 'Sharada', 'Sinhala', 'Sundanese', 'Syloti_Nagri', 'Tagalog', 'Tagbanwa', 'Tai_Le', 'Tai_Tham', 'Tai_Viet', 'Takri', 'Tamil', 'Telugu', 'Thai', 'Tibetan'],
+    'CJKV': ['Bopomofo', 'Han', 'Hangul', 'Hiragana', 'Katakana', 'Yi'],
+    'Cuneiform': ['Cuneiform', 'Old_Persian'],
+    'Ethiopic': ['Ethiopic', 'Old_South_Arabian'],
+    'Hebrew': ['Samaritan','Hebrew'],
+    'Meroitic': ['Meroitic_Cursive', 'Meroitic_Hieroglyphs'],
+    'Pahlavi': ['Inscriptional_Parthian', 'Inscriptional_Pahlavi'],
+    'Phoenician': ['Phoenician', 'Lycian', 'Lydian'],
+}
+script_to_family = {script: family for family, scripts in family_groups.items() for script in scripts}
+
 def script_family(chr):
-    chr_script=script(chr)
-    
-    if chr_script in ['Common', 'Inherited', 'Unknown']:
-        return ''
-    elif chr_script in ['Imperial_Aramaic', 'Syriac', 'Mandaic']:
-        return 'Aramaic'
-    elif chr_script in ['Avestan', 'Balinese', 'Batak', 'Bengali', 'Brahmi', 'Buhid', 'Buginese', 'Chakma', 'Cham', 'Devanagari', 'Gujarati', 'Gurmukhi', 'Hanunoo', 'Javanese', 'Kaithi', 'Kannada', 'Kayah_Li', 'Khmer', 'Lao', 'Lepcha', 'Limbu', 'Malayalam', 'Meetei_Mayek', 'Mongolian', 'New_Tai_Lue', 'Oriya', 'Rejang', 'Saurashtra', 'Sharada', 'Sinhala', 'Sundanese', 'Syloti_Nagri', 'Tagalog', 'Tagbanwa', 'Tai_Le', 'Tai_Tham', 'Tai_Viet', 'Takri', 'Tamil', 'Telugu', 'Thai', 'Tibetan']:
-        return 'Brahmi'
-    elif chr_script in ['Bopomofo', 'Han', 'Hangul', 'Hiragana', 'Katakana', 'Yi']:
-        return 'CJKV'
-    elif chr_script in ['Cuneiform', 'Old_Persian']:
-        return 'Cuneiform'    
-    elif chr_script in ['Ethiopic', 'Old_South_Arabian']:
-        return 'Ethiopic'
-    elif chr_script in ['Samaritan','Hebrew']:
-        return  'Hebrew'
-    elif chr_script in ['Meroitic_Cursive', 'Meroitic_Hieroglyphs']:
-        return 'Meroitic'
-    elif chr_script in ['Inscriptional_Parthian', 'Inscriptional_Pahlavi']:
-        return 'Pahlavi'
-    elif chr_script in ['Phoenician', 'Lycian', 'Lydian']:
-        return 'Phoenician'    
-    else:
-        return chr_script    
+    chr_script = script(chr)
+    return script_to_family.get(chr_script, chr_script)
+
+def _build_family_table():
+    '''
+    Family names and a table with the family id of each codepoint, 0 being no family.
+    Only alphabetic characters have a family in the table, the table ends at the last one.
+    '''
+    family_names = ['']
+    script_ids = []
+    for name in script_data['names']:
+        family = script_to_family.get(name, name)
+        if family not in family_names:
+            family_names.append(family)
+        script_ids.append(family_names.index(family))
+
+    table = bytearray(script_data['idx'][-1][1] + 1)
+    for start, end, script_index, _ in script_data['idx']:
+        family_id = script_ids[script_index]
+        if family_id == 0:
+            continue
+        for codepoint in range(start, end + 1):
+            if chr(codepoint).isalpha():
+                table[codepoint] = family_id
+    return family_names, bytes(table.rstrip(b'\0'))
+
+family_names, family_table = _build_family_table()
+
+def script_families(text):
+    ''' Set of family ids of the alphabetic characters in text, see family_names '''
+    table = family_table
+    size = len(table)
+    families = {table[codepoint] for codepoint in map(ord, text) if codepoint < size}
+    families.discard(0)
+    return families
+
+def letter_ranges():
+    '''
+    Codepoint ranges (start, end) of the letters, unicode categories L*, in the unicode version of this Python.
+    Scanning all the codepoints takes a while, so the ranges are cached on disk.
+    '''
+    cache_name = f'letters-{unicodedata.unidata_version}.txt'
+    cache_file = os.path.join(cache_dir(), cache_name)
+    try:
+        with open(cache_file) as cache:
+            return [tuple(int(n, 16) for n in line.split()) for line in cache]
+    except (OSError, ValueError):
+        pass
+
+    ranges = []
+    start = None
+    for codepoint in range(sys.maxunicode + 1):
+        if unicodedata.category(chr(codepoint))[0] == 'L':
+            if start is None:
+                start = codepoint
+        elif start is not None:
+            ranges.append((start, codepoint - 1))
+            start = None
+
+    try:
+        write_cache_file(cache_name, ''.join(f'{start:x} {end:x}\n' for start, end in ranges))
+    except OSError as e:
+        logging.debug(f"Could not cache letter ranges in {cache_file}: {e}")
+    return ranges
+
+_non_letters = None
+
+def non_letters_regex():
+    ''' Compiled regex matching runs of characters that are not letters '''
+    global _non_letters
+    if _non_letters is None:
+        letters = ''.join(f'\\U{start:08x}-\\U{end:08x}' for start, end in letter_ranges())
+        _non_letters = re.compile(f'[^{letters}]+')
+    return _non_letters
 
 #def _compile_scripts_txt():
 #    # build indexes from 'scripts.txt'
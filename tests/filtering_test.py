@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+
+import pickle
+
+import pytest
+
+from hardrules.hardrules import Hardrules
+from hardrules.filtering import HardrulesConfig, Verdict, filter_pairs
+
+from rules_test import pairs
+
+def expected_verdicts(hardrules):
+    verdicts = []
+    for left, right in pairs:
+        reasons = hardrules.wrong_tu(left, right)
+        verdicts.append(Verdict(False, reasons) if reasons else Verdict(True, []))
+    return verdicts
+
+def test_config():
+    config = HardrulesConfig(source_lang="en", target_lang="de", disable_lang_ident=True, run_all_rules=True)
+    # Without metadata there are no models
+    assert config.disable_lm_filter and config.disable_porn_removal
+    assert config.porn_removal is None
+    hardrules = Hardrules(config)
+    assert hardrules.run_all_rules
+    assert hardrules.lm_filter is None and hardrules.fastspell_src is None
+    assert pickle.loads(pickle.dumps(config)) == config
+
+    with pytest.raises(ValueError):
+        HardrulesConfig(source_lang="en")
+
+def test_config_files(tmp_path):
+    metadata = tmp_path / "metadata.yaml"
+    metadata.write_text("source_lang: en\ntarget_lang: de\n")
+    rules = tmp_path / "rules.yaml"
+    rules.write_text("no_urls: true\n")
+    config = HardrulesConfig(metadata=str(metadata), rules_config=str(rules))
+    assert (config.source_lang, config.target_lang) == ("en", "de")
+    assert config.metadata_yaml["yamldir"] == str(tmp_path)
+    assert config.rules_config == {"no_urls": True}
+    # No models in the metadata
+    assert config.disable_lm_filter and config.disable_porn_removal
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_filter_pairs(processes):
+    options = dict(source_lang="en", target_lang="de", disable_lang_ident=True, run_all_rules=True)
+    expected = expected_verdicts(Hardrules(HardrulesConfig(**options)))
+    # Chunks smaller than the input and a generator as input
+    verdicts = list(filter_pairs((pair for pair in pairs * 3), processes=processes, chunk_size=4, **options))
+    assert verdicts == expected * 3
+
+def test_filter_pairs_long():
+    config = HardrulesConfig(source_lang="en", target_lang="de", disable_lang_ident=True)
+    long_pair = ("word " * 3000, "Wort " * 3000)
+    verdicts = list(filter_pairs([pairs[0], long_pair], config))
+    assert verdicts == [Verdict(True, []), Verdict(False, ["not_too_long"])]
+
+    with pytest.raises(TypeError):
+        list(filter_pairs(pairs, config, run_all_rules=True))
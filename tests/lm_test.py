@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+
+import pytest
+
+from hardrules.lm import LMFluencyFilter, LMType, load_lm_filter, load_methods
+
+toy_arpa = """
+\\data\\
+ngram 1=4
+ngram 2=2
+
+\\1-grams:
+-1.0\t<unk>\t0
+-0.5\t<s>\t-0.3
+-0.5\t</s>\t0
+-0.7\thello\t-0.2
+
+\\2-grams:
+-0.2\t<s> hello
+-0.3\thello </s>
+
+\\end\\
+"""
+
+def test_load_methods(tmp_path):
+    lm_path = tmp_path / "toy.arpa"
+    lm_path.write_text(toy_arpa)
+
+    default = LMFluencyFilter(LMType.CHARACTER, "en", None)
+    default.load_lm(str(lm_path))
+    for load_method in load_methods:
+        lm_filter = LMFluencyFilter(LMType.CHARACTER, "en", None)
+        lm_filter.load_lm(str(lm_path), load_method)
+        assert lm_filter.lm.score("hello") == default.lm.score("hello")
+
+def test_unknown_load_method():
+    with pytest.raises(ValueError):
+        load_lm_filter("en", "de", {"lm_type": "CHARACTER", "lm_load_method": "mmap"}, None, None)
+
+def test_score_batch(tmp_path):
+    lm_path = tmp_path / "toy.arpa"
+    lm_path.write_text(toy_arpa)
+
+    sentences = ["hello", "Hello, hello world", "", "hello  hello"]
+    for lm_type in (LMType.CHARACTER, LMType.PLACEHOLDER):
+        lm_filter = LMFluencyFilter(lm_type, "en", None)
+        lm_filter.load_lm(str(lm_path))
+        assert lm_filter.score_batch(sentences) == [lm_filter.score(sentence) for sentence in sentences]
@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+
+import os
+
+from multiprocessing import Queue
+
+from hardrules.progress import Progress, ProgressWriter
+
+class FakeWorker:
+    pid = os.getpid()
+
+def test_progress_metrics(tmp_path):
+    progress = Progress(2)
+    jobs_queue = Queue()
+    jobs_queue.put((0, "block"))
+    path = str(tmp_path / "metrics.prom")
+    writer = ProgressWriter(progress, path, 0.01, {"jobs": jobs_queue}, [FakeWorker(), FakeWorker()], input_bytes=100)
+    writer.start()
+
+    progress.blocks_mapped.value += 3
+    progress.bytes_mapped.value += 60
+    progress.rows_finished[1] += 500
+    progress.blocks_finished[1] += 1
+    progress.reorder_heap.value = 2
+    writer.stop()
+
+    with open(path) as f:
+        metrics = dict(line.rsplit(" ", 1) for line in f.read().splitlines() if not line.startswith("#"))
+    assert metrics["hardrules_blocks_mapped_total"] == "3"
+    assert metrics["hardrules_bytes_mapped_total"] == "60"
+    assert metrics["hardrules_input_bytes"] == "100"
+    assert metrics['hardrules_rows_finished_total{worker="1"}'] == "500"
+    assert metrics['hardrules_blocks_finished_total{worker="0"}'] == "0"
+    assert metrics["hardrules_reorder_heap_size"] == "2"
+    assert float(metrics['hardrules_rows_per_second{worker="0"}']) == 0
+    if 'hardrules_queue_size{queue="jobs"}' in metrics:
+        assert metrics['hardrules_queue_size{queue="jobs"}'] == "1"
+    if os.path.exists("/proc/self/statm"):
+        assert int(metrics['hardrules_worker_resident_bytes{worker="0"}']) > 0
@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+
+from hardrules.result_cache import ResultCache, entry_size
+
+def test_lru_eviction():
+    cache = ResultCache(3 * entry_size / (1024 * 1024))
+    assert cache.max_entries == 3
+    calls = []
+    def length(sentence):
+        calls.append(sentence)
+        return len(sentence)
+    cached = cache.wrap("length", length)
+
+    assert [cached(s) for s in ["a", "bb", "a", "ccc"]] == [1, 2, 1, 3]
+    assert calls == ["a", "bb", "ccc"]
+    # "bb" is the least recently used one
+    cached("dddd")
+    assert len(cache) == 3
+    cached("a")
+    cached("bb")
+    assert calls == ["a", "bb", "ccc", "dddd", "bb"]
+    assert cache.hits == 2 and cache.misses == 5
+    assert "hit rate 28.6%" in cache.stats()
+
+def test_wrap_batch():
+    cache = ResultCache(1)
+    batches = []
+    def lengths(sentences):
+        batches.append(sentences)
+        return [len(sentence) for sentence in sentences]
+    cached = cache.wrap_batch("lengths", lengths)
+
+    assert cached(["a", "bb", "a", "", "bb"]) == [1, 2, 1, 0, 2]
+    assert cached(["ccc", "a", "ccc"]) == [3, 1, 3]
+    assert cached(["a", "ccc"]) == [1, 3]
+    assert batches == [["a", "bb", ""], ["ccc"]]
+    # Results are keyed by name too
+    assert cache.wrap("other", lambda sentence: None)("a") is None
+
+def test_disabled_cache():
+    cache = ResultCache(0)
+    assert cache.wrap("length", len) is len
+    assert cache.wrap_batch("length", list) is list
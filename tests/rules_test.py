@@ -0,0 +1,313 @@
+#!/usr/bin/env python
+
+import argparse
+
+from inspect import signature
+
+from hardrules.hardrules import Hardrules
+
+pairs = [
+    ("This is a clean sentence", "Das ist ein sauberer Satz"),
+    ("", "Das ist ein sauberer Satz"),
+    ("", ""),
+    ("Short", "Kurz"),
+    ("Home > News > Sports > Football", "Start > Nachrichten > Sport > Fußball"),
+    ("Visit http://example.com for more", "Besuchen Sie http://example.com"),
+    ("This Is A Title Case Sentence", "Das Ist Ein Titel Satz"),
+    ("GluedWordsAreHere in this sentence", "Zusammen GeklebteWörter in diesem Satz"),
+    ("Ã©tÃ© is some mojibake text", "Das ist Â kaputter Text hier"),
+    ("[unbalanced brackets here", "unbalanced brackets here]"),
+    ("12345 67890 11111 22222", "12345 67890 11111 22222"),
+    ("Re: your message from yesterday", "Re: deine Nachricht von gestern"),
+    ("this is repeated text this is repeated text", "Das ist wiederholter Text hier"),
+    ("Escaped \\u2019 unicode in this line", "Escaped \\xc3 unicode in dieser Zeile"),
+    ("Same sentence in both sides", "Same sentence in both sides"),
+    ("one two three four five six seven eight nine ten eleven twelve", "eins"),
+]
+
+def hardrules_args(run_all_rules, rules_config=None):
+    return argparse.Namespace(
+            source_lang="en", target_lang="de",
+            disable_lm_filter=True, lm_threshold=0.5,
+            disable_porn_removal=True, disable_lang_ident=True,
+            disable_minimal_length=False, run_all_rules=run_all_rules,
+            rules_config=rules_config, metadata_yaml=None, porn_removal=None,
+            source_tokenizer_command=None, target_tokenizer_command=None)
+
+def check_batch(run_all_rules, rules_config=None):
+    hardrules = Hardrules(hardrules_args(run_all_rules, rules_config))
+    lefts = [left for left, _ in pairs]
+    rights = [right for _, right in pairs]
+    verdicts, reasons = hardrules.wrong_tu_batch(lefts, rights)
+    assert len(verdicts) == len(pairs) and len(reasons) == len(pairs)
+
+    for (left, right), keep, code in zip(pairs, verdicts, reasons):
+        expected = hardrules.wrong_tu(left, right)
+        if expected == False:
+            assert keep == 1 and code == 0
+        else:
+            labels = hardrules.reason_labels(code)
+            assert keep == 0
+            if run_all_rules:
+                assert labels == expected
+            else:
+                assert labels == [expected]
+
+def legacy_wrong_tu(hardrules, left, right):
+    ''' Rules applied as before the pipeline was compiled: looking up each c_ method and its sides per pair '''
+    discards = []
+    for rule_name, param in hardrules.config.items():
+        if not param:
+            continue
+        rule_func = hardrules.rules['c_' + rule_name]
+        if 'sentence' in signature(rule_func).parameters:
+            for sidename, side in {'left': left, 'right': right}.items():
+                if rule_func(side, sidename):
+                    continue
+                if not hardrules.run_all_rules:
+                    return f"{rule_name}({sidename})"
+                if rule_name == 'no_empty':
+                    return [f"no_empty({name})" for name, s in (('left', left), ('right', right)) if s == ""]
+                discards.append(f"{rule_name}({sidename})")
+        elif not rule_func(left, right):
+            if not hardrules.run_all_rules:
+                return f"{rule_name}(left,right)"
+            discards.append(f"{rule_name}(left,right)")
+    return discards if discards else False
+
+def test_pipeline_matches_legacy():
+    configs = [None, {"no_urls": True, "no_number_inconsistencies": True, "no_script_inconsistencies": True},
+               {"no_breadcrumbs": False, "not_too_short": 5, "no_literals": ["Re:", "sentence"]}]
+    for run_all_rules in (False, True):
+        for config in configs:
+            hardrules = Hardrules(hardrules_args(run_all_rules, config))
+            for left, right in pairs:
+                assert hardrules.wrong_tu(left, right) == legacy_wrong_tu(hardrules, left, right), (left, right, config)
+
+def test_batch_first_discard():
+    check_batch(False)
+
+def test_batch_run_all_rules():
+    check_batch(True)
+
+def test_batch_custom_config():
+    config = {"no_urls": True, "no_number_inconsistencies": True, "no_script_inconsistencies": True}
+    check_batch(False, config)
+    check_batch(True, config)
+
+def test_disabled_rules_not_compiled():
+    hardrules = Hardrules(hardrules_args(False, {"no_urls": False}))
+    names = {step[0] for step in hardrules.pipeline}
+    assert "no_urls" not in names
+    # Rules that need models are left out when models are not loaded
+    assert "no_wrong_language" not in names
+    assert "lm_filter" not in names
+    assert "no_porn" not in names
+
+def test_noise_scanner_matches_rules():
+    tricky = [left for left, _ in pairs] + [right for _, right in pairs] + [
+        "Ünïcödé ÄÖÜ ßẞ þýðir", "日本語の文章です 123", "12345", "١٢٣٤٥ arabic digits",
+        "a > b > c", "a | b", "«quoted» text", "MixedCase ÀccentedGlued ÉtéÉté",
+        "tab\there", "many   spaces", "\\\\u00e9 and \\\\x41", "www.example.org",
+    ]
+    for lang in ("en", "is", "ja"):
+        args = hardrules_args(True)
+        args.source_lang = lang
+        hardrules = Hardrules(args)
+        scanner = hardrules.noise_scanners["left"]
+        for sentence in tricky:
+            for name in scanner.enabled:
+                expected = getattr(hardrules, "c_" + name)(sentence, "left")
+                assert scanner.rule(name)(sentence) == expected, (lang, name, sentence)
+
+def test_no_literals_automaton():
+    literals = ["Re:", "{{", "%s", "}}", "+++", "***", '="', "cookies", "Powered by", "ñandú", "日本"]
+    sentences = [left for left, _ in pairs] + ["We use cookies here", "Powered by nothing",
+            "un ñandú corre", "日本語", "a = b", "x=\"y\"", "Re", "{ {", ""]
+    hardrules = Hardrules(hardrules_args(False, {"no_literals": literals}))
+    for sentence in sentences:
+        expected = not any(literal in sentence for literal in literals)
+        assert hardrules.c_no_literals(sentence, "left") == expected, sentence
+
+    # Without literals the rule is left out of the pipeline and keeps every sentence
+    hardrules = Hardrules(hardrules_args(False, {"no_literals": []}))
+    assert "no_literals(left)" not in hardrules.labels
+    assert all(hardrules.c_no_literals(sentence, "left") for sentence in sentences)
+
+def test_script_families():
+    from hardrules.writing_scripts import family_names, script_families
+    assert [family_names[f] for f in script_families("Hello, мир!")] in (["Latin", "Cyrillic"], ["Cyrillic", "Latin"])
+    assert [family_names[f] for f in script_families("日本語のテキスト 123")] == ["CJKV"]
+    # Marks and digits do not count, only alphabetic characters
+    assert [family_names[f] for f in script_families("हिन्दी १२३")] == ["Brahmi"]
+    assert script_families("123 !? ...") == set()
+
+    hardrules = Hardrules(hardrules_args(False, {"no_script_inconsistencies": True}))
+    assert hardrules.c_no_script_inconsistencies("Привет мир", "left")
+    assert not hardrules.c_no_script_inconsistencies("Привет world", "left")
+
+def test_letter_ranges_cache(tmp_path, monkeypatch):
+    import random
+    import unicodedata
+    from hardrules.writing_scripts import letter_ranges
+
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    ranges = letter_ranges()
+    assert list(tmp_path.glob("bicleaner-hardrules/letters-*.txt"))
+    assert letter_ranges() == ranges
+
+    letters = set()
+    for start, end in ranges:
+        letters.update(range(start, end + 1))
+    random.seed(1)
+    for codepoint in random.sample(range(0x110000), 20000) + list(range(0x3000)):
+        assert (codepoint in letters) == unicodedata.category(chr(codepoint)).startswith("L")
+
+class FakeFastSpell:
+    def __init__(self, lang):
+        self.lang = lang
+
+    def getlang(self, sentence):
+        return "de" if " ist " in sentence or " ein " in sentence else "en"
+
+    def getlangs(self, sentences):
+        return [self.getlang(sentence) for sentence in sentences]
+
+def test_batch_wrong_language():
+    for run_all_rules in (False, True):
+        hardrules = Hardrules(hardrules_args(run_all_rules, {"no_wrong_language": 20}))
+        hardrules.fastspell_src, hardrules.fastspell_trg = FakeFastSpell("en"), FakeFastSpell("de")
+        hardrules.lang_check = False
+        hardrules.recompile()
+        assert "no_wrong_language(left)" in hardrules.labels
+
+        lefts = [left for left, _ in pairs] + ["Das ist ein englischer Satz", "Kurz ist ein"]
+        rights = [right for _, right in pairs] + ["Das ist ein deutscher Satz", "Kurz ist ein"]
+        verdicts, reasons = hardrules.wrong_tu_batch(lefts, rights)
+        for left, right, keep, code in zip(lefts, rights, verdicts, reasons):
+            expected = hardrules.wrong_tu(left, right)
+            if expected == False:
+                assert keep == 1
+            else:
+                labels = hardrules.reason_labels(code)
+                assert labels == (expected if run_all_rules else [expected])
+
+class FakePornModel:
+    def __init__(self):
+        self.calls = 0
+
+    def label(self, text):
+        return '__label__positive' if 'sex' in text.split() else '__label__negative'
+
+    def predict(self, text):
+        self.calls += 1
+        if isinstance(text, list):
+            return [[self.label(t)] for t in text], [[1.0] for _ in text]
+        return [self.label(text)], [1.0]
+
+def test_batch_porn_removal():
+    from hardrules.tokenizer import Tokenizer
+    for side in ("sl", "tl"):
+        hardrules = Hardrules(hardrules_args(True))
+        hardrules.porn_removal, hardrules.porn_removal_side = FakePornModel(), side
+        hardrules.porn_tokenizer = Tokenizer(None, "en")
+        hardrules.recompile()
+
+        lefts = [left for left, _ in pairs] + ["This sentence talks about SEX.", "A clean one here"]
+        rights = [right for _, right in pairs] + ["Ein sauberer Satz hier", "Dieser Satz ist über Sex!"]
+        verdicts, reasons = hardrules.wrong_tu_batch(lefts, rights)
+        assert hardrules.porn_removal.calls == 1
+        for left, right, keep, code in zip(lefts, rights, verdicts, reasons):
+            expected = hardrules.wrong_tu(left, right)
+            if expected == False:
+                assert keep == 1
+            else:
+                assert hardrules.reason_labels(code) == expected
+        assert "no_porn(left,right)" in hardrules.reason_labels(reasons[-2 if side == "sl" else -1])
+
+def test_adaptive_order():
+    lefts = [left for left, _ in pairs]
+    rights = [right for _, right in pairs]
+    args = hardrules_args(False)
+    args.adaptive_order = 10
+    hardrules = Hardrules(args)
+    expected = [hardrules.wrong_tu(left, right) for left, right in pairs]
+
+    def check(exact):
+        verdicts, reasons = hardrules.wrong_tu_batch(lefts, rights)
+        for keep, code, label in zip(verdicts, reasons, expected):
+            assert keep == (label == False)
+            if exact and label != False:
+                assert hardrules.reason_labels(code) == [label]
+
+    # The first block is a sample, then the steps are reordered
+    check(True)
+    assert hardrules.order is not None and sorted(hardrules.order) == list(range(len(hardrules.pipeline)))
+    assert hardrules.step_rejects[hardrules.labels.index("no_empty(left)")] == 2
+    check(True)
+
+    # Worst case for the reasons, every rule before its pipeline position
+    hardrules.order = hardrules.order[:2] + sorted(hardrules.order[2:], reverse=True)
+    check(True)
+    hardrules.exact_reasons = False
+    check(False)
+
+def test_adaptive_order_scanner_group():
+    ''' Noise scanner steps of a side share one scan, they are measured and moved together '''
+    lefts = [left for left, _ in pairs]
+    rights = [right for _, right in pairs]
+    args = hardrules_args(False)
+    args.adaptive_order = 10
+    hardrules = Hardrules(args)
+    hardrules.wrong_tu_batch(lefts, rights)
+
+    for side in ('left', 'right'):
+        steps = [n for n, group in enumerate(hardrules.step_groups) if group == ('scanner', side)]
+        assert len(steps) == len(hardrules.noise_scanners[side].enabled) > 1
+        positions = [hardrules.order.index(n) for n in steps]
+        assert positions == list(range(positions[0], positions[0] + len(steps)))
+        assert hardrules.group_rejects[('scanner', side)] <= sum(hardrules.step_rejects[n] for n in steps)
+
+def test_rule_stats():
+    from hardrules.rule_stats import RuleStats
+    lefts = [left for left, _ in pairs]
+    rights = [right for _, right in pairs]
+    for run_all_rules in (False, True):
+        args = hardrules_args(run_all_rules)
+        args.profile_rules = True
+        hardrules = Hardrules(args)
+        verdicts, reasons = hardrules.wrong_tu_batch(lefts, rights)
+
+        stats = RuleStats.from_dicts([hardrules.stats.to_dict(), hardrules.stats.to_dict()])
+        report = stats.report()
+        assert report["pairs"] == 2 * len(pairs) and report["kept"] == 2 * sum(verdicts)
+        rules = {rule["label"]: rule for rule in report["rules"]}
+        assert rules["no_empty(left)"]["calls"] == 2 * len(pairs)
+        assert rules["no_empty(left)"]["rejected"] == 4 and rules["no_empty(left)"]["side"] == "left"
+        assert set(rules["no_empty(left)"]["time_per_pair"]) == {"mean", "p50", "p90", "p99"}
+        for label, rule in rules.items():
+            expected = sum(1 for code in reasons if code >> hardrules.labels.index(label) & 1)
+            assert rule["rejected"] == 2 * expected
+        if not run_all_rules:
+            assert sum(rule["rejected"] for rule in report["rules"]) + report["kept"] == report["pairs"]
+
+def test_rule_stats_adaptive_order():
+    ''' Rules applied to sample the order and to find the reasons are not counted as pipeline calls '''
+    lefts = [left for left, _ in pairs]
+    rights = [right for _, right in pairs]
+    args = hardrules_args(False)
+    args.profile_rules = True
+    args.adaptive_order = 1
+    hardrules = Hardrules(args)
+    hardrules.wrong_tu_batch(lefts, rights)
+    sampled = hardrules.stats.report()["rules"]
+    assert all(rule["calls"] == 0 and rule["time"] == 0.0 for rule in sampled)
+    assert sampled[0]["extra_calls"] == len(pairs)
+
+    hardrules.wrong_tu_batch(lefts, rights)
+    report = hardrules.stats.report()
+    rules = {rule["label"]: rule for rule in report["rules"]}
+    assert report["pairs"] == 2 * len(pairs)
+    assert rules["no_empty(left)"]["calls"] == len(pairs)
+    assert rules["no_empty(left)"]["extra_calls"] == len(pairs)
+    assert all(rule["calls"] <= len(pairs) for rule in report["rules"])
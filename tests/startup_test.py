@@ -0,0 +1,27 @@
+#!/usr/bin/env python
+
+import json
+import subprocess
+import sys
+
+from hardrules.models import real_metadata_path
+
+def test_heavy_modules_not_imported():
+    code = "import sys, hardrules.bicleaner_hardrules; " \
+            "print(' '.join(m for m in ('fasttext', 'fastspell', 'kenlm', 'sacremoses', 'yaml', 'huggingface_hub') if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == ""
+
+def test_snapshot_path_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    repo = tmp_path / "hub" / "models--bitextor--bicleaner-ai-full-en-de"
+    snapshot = repo / "snapshots" / "abc123"
+    snapshot.mkdir(parents=True)
+    (repo / "refs").mkdir()
+    (repo / "refs" / "main").write_text("abc123")
+    cache = tmp_path / "cache" / "bicleaner-hardrules"
+    cache.mkdir(parents=True)
+    (cache / "snapshots.json").write_text(json.dumps({"bitextor/bicleaner-ai-full-en-de": str(snapshot)}))
+
+    # Resolved from the cache, without looking in the HF cache
+    assert real_metadata_path("bitextor/bicleaner-ai-full-en-de") == f"{snapshot}/metadata.yaml"
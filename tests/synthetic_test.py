@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+
+import argparse
+import gzip
+import io
+
+import pytest
+
+from hardrules.hardrules import Hardrules
+from hardrules.synthetic import generate_pairs, write_bitext, parse_mixture, noise_kinds
+
+from rules_test import hardrules_args
+
+def test_deterministic():
+    pairs = list(generate_pairs(3000, seed=7, duplicate_rate=0.1, chunk_size=1000))
+    assert len(pairs) == 3000
+    assert pairs == list(generate_pairs(3000, seed=7, duplicate_rate=0.1, chunk_size=1000))
+    assert pairs != list(generate_pairs(3000, seed=8, duplicate_rate=0.1, chunk_size=1000))
+
+def test_parallel_output():
+    serial = io.BytesIO()
+    write_bitext(serial, 2500, seed=3, chunk_size=1000)
+    parallel = io.BytesIO()
+    write_bitext(parallel, 2500, seed=3, chunk_size=1000, processes=2, compression='gzip')
+    assert gzip.decompress(parallel.getvalue()) == serial.getvalue()
+    assert serial.getvalue().count(b"\n") == 2500
+
+def test_mixture():
+    mixture = parse_mixture("clean=1,urls=3")
+    kinds = [kind for _, _, kind in generate_pairs(2000, mixture=mixture)]
+    assert set(kinds) == {"clean", "urls"}
+    assert 0.7 < kinds.count("urls") / len(kinds) < 0.8
+
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_mixture("clean=1,unknown=1")
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_mixture("clean=0")
+
+def test_duplicates():
+    pairs = list(generate_pairs(2000, duplicate_rate=0.5, chunk_size=500))
+    assert 0.4 < 1 - len(set(pairs)) / len(pairs) < 0.6
+    assert len(set(generate_pairs(2000))) == 2000
+
+def test_noise_is_discarded():
+    ''' Each kind of noise is discarded by its rule and clean pairs are kept '''
+    hardrules = Hardrules(hardrules_args(True, {"no_urls": True}))
+    for left, right, kind in generate_pairs(3000, seed=5):
+        reasons = hardrules.wrong_tu(left, right)
+        if kind == "clean":
+            # Word counts of clean pairs are rarely too different
+            assert not reasons or reasons == ["length_ratio(left,right)"]
+        elif kind != "wrong_language":
+            rule = noise_kinds[kind][1]
+            assert any(reason.startswith(rule + "(") for reason in reasons), (left, right, kind)
@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+
+import shutil
+
+import pytest
+
+from hardrules.tokenizer import Tokenizer
+
+sentences = ["Hello, world!", "", "  spaces  around  ", "Ünïcödé, été ’quotes’", "carriage\rreturn", "a &amp; b"]
+
+@pytest.mark.skipif(shutil.which("sed") is None, reason="needs sed")
+def test_external_tokenize_stream():
+    tokenizer = Tokenizer("sed -u s/,/_,/g", "en")
+    try:
+        expected = [tokenizer.tokenize(sentence) for sentence in sentences]
+        assert tokenizer.tokenize(sentences) == expected
+        # Bigger than the pipe buffers, so writing and reading must overlap
+        many = sentences * 20000
+        assert tokenizer.tokenize(many) == expected * 20000
+        assert tokenizer.tokenize([]) == []
+        # The process is still in sync for one sentence at a time
+        assert tokenizer.tokenize("one, two") == ["one_,", "two"]
+    finally:
+        tokenizer.close()
+
+def test_external_tokenizer_stopped():
+    tokenizer = Tokenizer("head -n 2", "en")
+    try:
+        with pytest.raises(RuntimeError):
+            tokenizer.tokenize(sentences)
+    finally:
+        tokenizer.close()
+
+def test_moses_tokenize_list():
+    tokenizer = Tokenizer(None, "en")
+    assert tokenizer.tokenize(sentences) == [tokenizer.tokenize(sentence) for sentence in sentences]
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+
+from hardrules.hardrules import Hardrules
+from hardrules.rule_stats import RuleStats
+from hardrules.verdict_store import VerdictStore
+
+from rules_test import hardrules_args
+
+lefts = ["This is a clean sentence", "", "Same sentence in both sides", "This is a clean sentence"]
+rights = ["Das ist ein sauberer Satz", "Das ist ein sauberer Satz", "Same sentence in both sides", "Das ist ein sauberer Satz"]
+
+class CountingHardrules(Hardrules):
+    def wrong_tu_batch(self, lefts, rights):
+        self.evaluated += len(lefts)
+        return super().wrong_tu_batch(lefts, rights)
+
+def test_verdict_store(tmp_path):
+    path = str(tmp_path / "verdicts.db")
+    hardrules = CountingHardrules(hardrules_args(True))
+    hardrules.evaluated = 0
+    expected = hardrules.wrong_tu_batch(lefts, rights)
+
+    VerdictStore.prepare(path, "config-a")
+    store = VerdictStore(path)
+    hardrules.evaluated = 0
+    assert store.wrong_tu_batch(hardrules, lefts[:2], rights[:2]) == (expected[0][:2], expected[1][:2])
+    assert store.wrong_tu_batch(hardrules, lefts, rights) == expected
+    assert hardrules.evaluated == 3
+    assert store.stats() == "3 known pairs, 3 new pairs"
+    store.close()
+
+    # Verdicts are kept for the same configuration and removed for a different one
+    VerdictStore.prepare(path, "config-a")
+    store = VerdictStore(path)
+    assert len(store) == 3
+    assert store.wrong_tu_batch(hardrules, lefts, rights) == expected
+    assert hardrules.evaluated == 3
+    store.close()
+
+    VerdictStore.prepare(path, "config-b")
+    store = VerdictStore(path)
+    assert len(store) == 0
+    store.close()
+
+def test_verdict_store_stats(tmp_path):
+    ''' Stored verdicts are counted in the totals but not in the calls of the rules '''
+    path = str(tmp_path / "verdicts.db")
+    hardrules = Hardrules(hardrules_args(True))
+    hardrules.stats = RuleStats(hardrules.labels)
+    hardrules.wrong_tu_batch(lefts, rights)
+    expected = hardrules.stats.report()
+
+    VerdictStore.prepare(path, "config-a")
+    store = VerdictStore(path)
+    hardrules.stats = RuleStats(hardrules.labels)
+    store.wrong_tu_batch(hardrules, lefts[:2], rights[:2])
+    store.wrong_tu_batch(hardrules, lefts[2:], rights[2:])
+    store.close()
+    report = hardrules.stats.report()
+
+    assert (report["pairs"], report["kept"], report["cached"]) == (expected["pairs"], expected["kept"], 1)
+    assert [rule["rejected"] for rule in report["rules"]] == [rule["rejected"] for rule in expected["rules"]]
+    assert report["rules"][0]["calls"] == expected["rules"][0]["calls"] - 1
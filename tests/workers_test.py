@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+
+import subprocess
+import sys
+import time
+
+from multiprocessing import BoundedSemaphore, Process
+
+from hardrules.bicleaner_hardrules import acquire_window
+
+def test_acquire_window_dead_worker():
+    window = BoundedSemaphore(1)
+    window.acquire()
+    worker = Process(target=time.sleep, args=(60,), daemon=True)
+    worker.start()
+    worker.kill()
+    worker.join()
+
+    # The window is full and the worker that would free it is dead
+    start = time.time()
+    assert not acquire_window(window, [worker], interval=0.1)
+    assert time.time() - start < 5
+
+    window.release()
+    assert acquire_window(window, [worker], interval=0.1)
+
+def test_run_ends_when_workers_die(tmp_path):
+    corpus = tmp_path / "corpus.tsv"
+    corpus.write_text("This is a clean sentence\tDas ist ein sauberer Satz\n" * 30000)
+    # Workers fail compiling the rules
+    config = tmp_path / "rules.yaml"
+    config.write_text('not_too_short: "a"\n')
+    result = subprocess.run([sys.executable, "-m", "hardrules.bicleaner_hardrules", str(corpus), str(tmp_path / "out.tsv"),
+                             "-s", "en", "-t", "de", "-p", "2", "-b", "1000", "-c", str(config), "--disable_lang_ident", "-q"],
+                            capture_output=True, timeout=120)
+    assert result.returncode == 1